@@ -0,0 +1,118 @@
+"""
+A single-threaded HTTP/1.1 server built on asyncio, which runs the same WSGI apps as wsgiserver.WSGIServer.
+Instead of a thread per connection, every connection is a coroutine on one event loop, so hundreds of clients
+polling at once don't run out of threads. The apps are called directly on the event loop, so they must be quick
+"""
+
+import io
+import sys
+import asyncio
+import traceback
+
+
+class AsyncServer:
+    def __init__(self, app, host:str="0.0.0.0", port:int=8000, timeout:float=10, maxBodySize:int=1<<20):
+        """Serves the WSGI app on host:port. Connections are closed if they go timeout seconds without finishing
+        the next part of a request (its first line, headers or body). A body bigger than maxBodySize bytes is
+        refused with 413 Payload Too Large, and a Content-Length which isn't a positive number with 400 Bad Request"""
+        self.app = app
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.maxBodySize = maxBodySize
+        self.loop = None
+        self.stopped = None
+        self.connections = {} # handler task: writer of every open connection
+
+    def start(self):
+        """Starts the server. This blocks until the server is stopped, so should be run in its own thread"""
+        asyncio.run(self.serve())
+
+    def stop(self):
+        """Stops the server, from any thread"""
+        if self.loop is not None: self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        async with server:
+            await self.stopped.wait()
+            for writer in self.connections.values(): writer.close() # wakes up their handlers, so they end cleanly
+            await asyncio.gather(*self.connections, return_exceptions=True)
+
+    async def handle(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        """Answers every request sent over a connection, until either side closes it"""
+        self.connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                requestLine = await asyncio.wait_for(reader.readline(), self.timeout)
+                if not requestLine: return # the client closed the connection
+                method, target, version = requestLine.decode("latin-1").split()
+
+                headers = await asyncio.wait_for(self.readHeaders(reader), self.timeout)
+                length = headers.get("content-length", "0")
+                if not length.isdigit(): # not a number, or negative
+                    writer.write(self.error("400 Bad Request"))
+                    return
+                if int(length) > self.maxBodySize:
+                    writer.write(self.error("413 Payload Too Large"))
+                    return
+                body = await asyncio.wait_for(reader.readexactly(int(length)), self.timeout)
+
+                keepAlive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(self.respond(method, target, headers, body, keepAlive))
+                await writer.drain()
+                if not keepAlive: return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass # the connection went idle, was closed part way through a request, or sent something that isn't HTTP
+        finally:
+            del self.connections[asyncio.current_task()]
+            writer.close()
+
+    async def readHeaders(self, reader:asyncio.StreamReader):
+        """Reads a request's headers into a dictionary of {lowercase name: value}"""
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return headers
+
+    def error(self, status:str):
+        """A response with just a status, after which the connection is closed, e.g. because the body can't be read"""
+        return f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode("latin-1")
+
+    def respond(self, method:str, target:str, headers:dict, body:bytes, keepAlive:bool):
+        """Runs the app for a request, giving back the whole response"""
+        path, _, query = target.partition("?")
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "CONTENT_TYPE": headers.get("content-type", ""),
+            "CONTENT_LENGTH": str(len(body)),
+            "SERVER_NAME": self.host,
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": False,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        response = {}
+        def start_response(status, responseHeaders, exc_info=None):
+            response["status"], response["headers"] = status, responseHeaders
+
+        try: content = b"".join(chunk if isinstance(chunk, bytes) else chunk.encode("latin-1") for chunk in self.app(environ, start_response))
+        except Exception:
+            traceback.print_exc()
+            response["status"], response["headers"], content = "500 Internal Server Error", [("Content-type", "text/plain")], b""
+
+        lines = [f"HTTP/1.1 {response['status']}"]
+        lines += [f"{name}: {value}" for name, value in response["headers"] if name.lower() not in ("content-length", "connection")]
+        lines += [f"Content-Length: {len(content)}", f"Connection: {'keep-alive' if keepAlive else 'close'}", "", ""]
+        return "\r\n".join(lines).encode("latin-1")+content
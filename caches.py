@@ -0,0 +1,67 @@
+"""
+Caches for surfaces which are slow to make but get made over and over again
+"""
+
+import pygame
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, capacity:int=1024):
+        """A dictionary of a limited size which throws away the least recently used item when it is full"""
+        self.capacity = capacity
+        self.items = OrderedDict()
+        self.hits = 0   # number of times an item was already cached
+        self.misses = 0 # number of times an item had to be made
+        self.lock = threading.Lock() # tanks can be made from the LAN data thread as well as the main thread
+
+    def get(self, key, make):
+        """Gets the item stored under a key, making it with make() and storing it if it isn't already there"""
+        with self.lock:
+            if key in self.items:
+                self.hits += 1
+                self.items.move_to_end(key) # it is now the most recently used item
+                return self.items[key]
+            self.misses += 1
+        item = make() # made outside of the lock, as this is the slow bit
+        with self.lock:
+            self.items[key] = item
+            if len(self.items) > self.capacity: self.items.popitem(last=False) # remove the least recently used item
+        return item
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self): return len(self.items)
+
+
+scaledImages = LRUCache(64)
+rotatedImages = LRUCache(4096) # enough for every barrel angle of both barrel colours and every tank angle
+renderedText = LRUCache(512)
+rotationStep = 1 # angles are rounded to the nearest multiple of this many degrees before rotating
+
+
+def scale(image: pygame.Surface, size: tuple):
+    """Scales an image to a size, giving back the same surface every time for the same image and size
+    so that every tank using the same image also shares its rotations"""
+    return scaledImages.get((image, size), lambda: pygame.transform.scale(image, size))
+
+
+def rotate(image: pygame.Surface, angle):
+    """Rotates an image anticlockwise by an angle in degrees, rounded to the nearest rotationStep"""
+    angle = (round(angle/rotationStep)*rotationStep) % 360
+    return rotatedImages.get((image, angle), lambda: pygame.transform.rotate(image, angle))
+
+
+def warmRotations(image: pygame.Surface, angles=range(360)):
+    """Rotates an image to each of the angles ahead of time, so they are already cached when needed"""
+    for angle in angles: rotate(image, angle)
+
+
+def renderText(font: pygame.font.Font, text: str, colour: tuple):
+    """Renders text in a font and colour, giving back the already rendered surface if it has been rendered before"""
+    return renderedText.get((font, text, colour), lambda: font.render(text, True, colour))
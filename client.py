@@ -1,55 +1,93 @@
-from http.client import HTTPConnection
+from queue import LifoQueue, Empty
+from http.client import HTTPConnection, HTTPException, RemoteDisconnected
+from urllib.parse import quote
+import protocol
 
 class Client:
-    def __init__(self, server_ip:str, server_port:int=8000):
+    def __init__(self, server_ip:str, server_port:int=8000, poolSize:int=4):
         self.ip = server_ip
         self.port = server_port
-        # self.conn = HTTPConnection(f"{server_ip}:{server_port}", timeout=10)
-
-    def getPlayerData(self):
-        """Retrieves data from the server"""
-        conn = HTTPConnection(f"{self.ip}:{self.port}", timeout=10)
-        conn.request("GET","/getPlayerData")
-        # self.conn.request("GET",path)
-        # r1 = self.conn.getresponse()
-        r1 = conn.getresponse()
-        content = r1.read()
-        conn.close()
-        return str(content, "utf-8")
-
-    def sendPlayerData(self, *data):
+        # idle connections to the server, kept open (keep-alive) to be reused instead of connecting for every
+        # request. the main loop and the data thread each take one out while using it, so they never share one
+        self.pool = LifoQueue()
+        self.poolSize = poolSize
+
+    def request(self, method:str, path:str, body:bytes=None):
+        """Sends a request to the server over a pooled connection and returns the response's content.
+        If a reused connection turns out to have been closed by the server, it tries once more on a new one.
+        Nothing else is retried, e.g. a timeout, as the server may have already acted on the request"""
+        try: conn = self.pool.get_nowait()
+        except Empty: return self.send(self.connect(), method, path, body)
+        try: return self.send(conn, method, path, body)
+        except (RemoteDisconnected, ConnectionResetError, BrokenPipeError): # probably closed for being idle
+            return self.send(self.connect(), method, path, body)
+
+    def connect(self):
+        """Opens a new connection to the server"""
+        return HTTPConnection(f"{self.ip}:{self.port}", timeout=10)
+
+    def send(self, conn:HTTPConnection, method:str, path:str, body:bytes=None):
+        """Sends a request over a connection and returns the response's content, putting the connection
+        back in the pool afterwards if it can be reused, or closing it if anything went wrong"""
+        try:
+            conn.request(method, path, body)
+            response = conn.getresponse()
+            content = response.read() # the whole response must be read before the connection can be reused
+        except (OSError, HTTPException):
+            conn.close()
+            raise
+
+        if response.will_close or self.pool.qsize() >= self.poolSize: conn.close()
+        else: self.pool.put(conn) # put it back for the next request
+        return content
+
+    def getPlayerData(self, since:int=0):
+        """Retrieves the server's state version and the players that have changed since the version since,
+        as a dictionary of {name: (x, y, angle, power, health)}"""
+        content = self.request("GET", f"/getPlayerData?since={since}")
+        if not content: return since, {} # nothing has changed
+        return protocol.decodePlayers(content)
+
+    def sendPlayerData(self, name, *data):
         """Sends data to the server"""
-        conn = HTTPConnection(f"{self.ip}:{self.port}", timeout=10)
-        path = "/sendPlayerData/" + "/".join([str(item) for item in data])
-        # self.conn.request("POST", path)
-        conn.request("POST", path)
-        conn.close()
+        self.request("POST", "/sendPlayerData", protocol.encodePlayers({name: data}))
     
-    def addPlayer(self, *data):
+    def addPlayer(self, name, *data):
         """Adds a player to the server"""
-        conn = HTTPConnection(f"{self.ip}:{self.port}", timeout=10)
-        path = "/addPlayer/" + "/".join([str(item) for item in data])
-        # self.conn.request("POST", path)
-        conn.request("POST", path)
-        conn.close()
+        self.request("POST", "/addPlayer", protocol.encodePlayers({name: data}))
     
-    def addProjectile(self, *data):
-        """Adds a projectile to the server"""
-        conn = HTTPConnection(f"{self.ip}:{self.port}", timeout=10)
-        path = "/addProjectile/" + "/".join([str(item) for item in data])
-        # self.conn.request("POST", path)
-        conn.request("POST", path)
-        conn.close()
+    def addProjectile(self, owner, *data):
+        """Adds a projectile fired by the player called owner to the server"""
+        self.request("POST", f"/addProjectile?name={quote(owner)}", protocol.encodeProjectiles([data]))
     
-    def getProjectileData(self):
-        """Retrieves data from the server"""
-        conn = HTTPConnection(f"{self.ip}:{self.port}", timeout=10)
-        conn.request("GET","/getProjectileData")
-        # self.conn.request("GET",path)
-        # r1 = self.conn.getresponse()
-        r1 = conn.getresponse()
-        content = r1.read()
-        conn.close()
-        return str(content, "utf-8")
-
-    # def stop(self): self.conn.close()
\ No newline at end of file
+    def getProjectileData(self, after:int=0, name:str=""):
+        """Retrieves the newest projectile's sequence number and the projectiles after the sequence number after
+        that weren't fired by name, as a list of (x, y, radius, angle, power, damage)"""
+        content = self.request("GET", f"/getProjectileData?after={after}&name={quote(name)}")
+        if not content: return after, [] # no new projectiles
+        return protocol.decodeProjectiles(content)
+
+    def exchange(self, name, data, projectiles, since:int=0, after:int=0):
+        """Sends this player's data and the projectiles they have fired, and retrieves (state version, players changed
+        since the version since, newest projectile's sequence number, projectiles after after), in one request"""
+        body = protocol.encodeExchange(protocol.encodePlayers({name: data}, since), protocol.encodeProjectiles(projectiles, after))
+        (version, players), (sequence, projectiles) = protocol.decodeExchange(
+            self.request("POST", "/exchange", body), protocol.PLAYERS, protocol.PROJECTILES)
+        return version, players, sequence, projectiles
+
+    def exchangeInputs(self, name, ticks, sequence:int, since:int=0, after:int=0, craterCursor:int=0):
+        """Sends this player's (inputs held down, shots) for a run of ticks, the first numbered sequence, to an
+        authoritative server. Retrieves (state version, players changed since the version since, newest projectile's
+        sequence number, projectiles after after, number of craters, craters after the first craterCursor,
+        sequence number of the last of this player's ticks the server has used), in one request"""
+        body = protocol.encodeExchange(protocol.encodeInputs(name, ticks, sequence), protocol.encodePlayers({}, since),
+                                       protocol.encodeProjectiles([], after), protocol.encodeCraters([], craterCursor))
+        players, projectiles, craters, inputs = protocol.decodeExchange(self.request("POST", "/exchange", body),
+            protocol.PLAYERS, protocol.PROJECTILES, protocol.CRATERS, protocol.INPUTS)
+        return (*players, *projectiles, *craters, inputs[0])
+
+    def stop(self):
+        """Closes all of the pooled connections"""
+        while True:
+            try: self.pool.get_nowait().close()
+            except Empty: return
\ No newline at end of file
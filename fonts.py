@@ -0,0 +1,42 @@
+"""
+Every font used by the game, each loaded only once and shared
+"""
+
+import os
+import pygame
+import threading
+
+fontsFolder = "fonts" # a .ttf file in here named after a font is used instead of searching the system fonts
+loadedFonts = {}
+lock = threading.Lock() # fonts can be preloaded from another thread
+
+
+def loadFont(name:str, size:int, bold:bool=False):
+    """Loads a font from a .ttf file, either given directly or bundled in the fonts folder,
+    otherwise searches the system fonts for it (which is slow the first time).
+    Raises FileNotFoundError if a .ttf file is given directly but doesn't exist"""
+    path = name if name[-4:] == ".ttf" else os.path.join(fontsFolder, name+".ttf")
+    if name[-4:] == ".ttf" and not os.path.isfile(path): raise FileNotFoundError(f"font file {path} doesn't exist")
+    if os.path.isfile(path):
+        font = pygame.font.Font(path, size)
+        font.set_bold(bold)
+        return font
+    return pygame.font.SysFont(name, size, bold=bold)
+
+
+def getFont(name:str="ebrima", size:int=15, bold:bool=False):
+    """Gets a font, loading it if this is the first time it has been asked for"""
+    key = (name, size, bold)
+    if key in loadedFonts: return loadedFonts[key] # fast path, without waiting for the lock
+    with lock: # stops two threads loading the same font at the same time
+        if key not in loadedFonts: loadedFonts[key] = loadFont(name, size, bold)
+        return loadedFonts[key]
+
+
+def preloadFonts(fonts:list, background:bool=True):
+    """Loads a list of (name, size, bold) fonts ahead of time so they are ready when needed,
+    in a separate thread if background is True"""
+    def load():
+        for font in fonts: getFont(*font)
+    if background: threading.Thread(target=load, daemon=True).start()
+    else: load()
@@ -3,20 +3,47 @@ import json
 import random
 import pygame
 import images
+import caches
+from fonts import getFont
 import threading
 import numpy as np
-from time import sleep
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter
+from zlib import crc32
+from pacer import FramePacer
+from sender import Sender
+from netcode import Interpolator
+from profiler import FrameProfiler
 from client import Client
 from server import Server
 from colours import black, white, light_blue, orange
-from math import sin, cos, atan, log, radians, degrees, pi
-from pygame.locals import QUIT, KEYDOWN, KEYUP, K_ESCAPE, K_F1
+from math import sin, cos, log, radians
+from pygame.locals import QUIT, KEYDOWN, KEYUP, K_ESCAPE, K_F1, K_F2
 
 # store constant variables as a dictionary in a json file
 with open("constants.json", "r") as constants: const = json.load(constants)
 
 # https://blog.finxter.com/python-dunder-methods-cheat-sheet/
 
+tickLength = 1000/const["tickrate"] # milliseconds of game time simulated each tick, no matter the frame rate
+maxFrameTime = 250 # longer frames than this aren't fully caught up on, so a slow frame can't snowball
+
+# to keep the game the same on every computer, the ground and projectile velocities are rounded to a whole
+# number of 1/fixedPoint pixels, so any tiny differences in floating point maths between computers disappear
+fixedPoint = 256
+rng = random.Random() # every random choice the game makes comes from here, so a seed replays the same game
+
+
+def seedGame(seed):
+    """Seeds the game's random choices, so the same seed (and the same inputs) plays out exactly the same"""
+    rng.seed(seed)
+
+
+def fixed(values):
+    """Rounds values to the nearest 1/fixedPoint, which is exactly representable as a float"""
+    return np.round(np.multiply(values, fixedPoint))/fixedPoint
+
 
 def clamp(value, min=0, max=1000):
     """Clamps a value between a minimum and maximum value"""
@@ -25,60 +52,144 @@ def clamp(value, min=0, max=1000):
     else: return value
 
 
-projectiles = []
+class ProjectileEngine:
+    fields = ("x", "y", "xvel", "yvel", "radius", "damage", "previousx", "previousy")
+
+    def __init__(self, capacity:int=64):
+        """Stores every projectile in flight as a NumPy array per attribute, so that they can
+        all be moved and collided with the ground in one go instead of one at a time"""
+        self.count = 0 # number of projectiles in flight, which are the first self.count items of each array
+        for field in self.fields: setattr(self, field, np.zeros(capacity))
+        self.lock = threading.Lock() # projectiles from other players are added from the LAN data thread
+        self.explodes = True # whether projectiles explode when they hit the ground, rather than the server saying where
+
+    def __len__(self): return self.count
+
+    def add(self, x, y, radius, angle, power, damage:int=30):
+        """Adds a projectile to the engine"""
+        with self.lock:
+            if self.count == len(self.x): self.resize(2*len(self.x)) # double the size of the arrays when they are full
+            i = self.count
+            self.x[i] = self.previousx[i] = x
+            self.y[i] = self.previousy[i] = y
+            self.radius[i] = radius
+            self.damage[i] = damage
+            self.xvel[i] = fixed((cos(radians(angle))*power)/4) # initial x and y velocities (scaled down by 4 to
+            self.yvel[i] = fixed((sin(radians(angle))*power)/4) # make the projectile travel at a reasonable speed)
+            self.count += 1
+
+    def resize(self, capacity:int):
+        """Changes the size of the arrays, keeping the projectiles in flight"""
+        for field in self.fields:
+            array = np.zeros(capacity)
+            array[:self.count] = getattr(self, field)[:self.count]
+            setattr(self, field, array)
+
+    def keep(self, mask):
+        """Removes every projectile which is False in the mask, moving the rest to the front of the arrays"""
+        kept = np.count_nonzero(mask)
+        for field in self.fields:
+            array = getattr(self, field)
+            array[:kept] = array[:self.count][mask]
+        self.count = kept
+
+    def clear(self): self.count = 0
+
+    def draw(self, surface, interpolation:float=1):
+        """Draws the projectiles on the given surface, interpolation of the way 
+        from where they were on the previous tick to where they are now"""
+        previousx, previousy = self.previousx[:self.count], self.previousy[:self.count]
+        x = previousx + (self.x[:self.count]-previousx)*interpolation
+        y = previousy + (self.y[:self.count]-previousy)*interpolation
+        for x, y, radius in zip(np.round(x).astype(int), np.round(y).astype(int), self.radius[:self.count].astype(int)):
+            pygame.draw.circle(surface, white, (x, y), radius)
+
+    def update(self, ground, tanks):
+        """Moves every projectile, then removes the ones which have left the screen or hit the ground"""
+        with self.lock:
+            if not self.count: return
+            x, y = self.x[:self.count], self.y[:self.count] # views, so changing them changes the arrays
+            yvel = self.yvel[:self.count]
+            startx, starty = x.copy(), y.copy()
+            self.previousx[:self.count] = startx
+            self.previousy[:self.count] = starty
+            x += self.xvel[:self.count] # update the x and y coordinates
+            y += yvel
+            yvel += const["gravity"] # simplified v = u + at, where a = gravity to update the y velocity
+
+            # only projectiles which have gone as low as the highest point of the ground could have hit it
+            candidates = np.flatnonzero(np.maximum(starty, y) >= ground.ycoords.min())
+            collided = np.zeros(self.count, dtype=bool)
+            if len(candidates):
+                hit, t = self.sweep(ground, startx[candidates], starty[candidates], x[candidates], y[candidates])
+                candidates, t = candidates[hit], t[hit]
+                collided[candidates] = True # if the projectile has collided with the ground
+                x[candidates] = startx[candidates] + t*(x[candidates]-startx[candidates]) # move it back to 
+                y[candidates] = starty[candidates] + t*(y[candidates]-starty[candidates]) # where it hit
+
+            onScreen = (0 < x) & (x < const["screenwidth"]) & (y <= const["screenheight"])
+            # explode in order of where they hit rather than the order they were added, which can be different
+            # on each computer, as the ground left by overlapping craters depends on the order they're made in
+            hits = np.flatnonzero(collided)
+            if self.explodes:
+                for i in hits[np.lexsort((y[hits], x[hits]))]: self.explode(i, ground, tanks)
+            self.keep(onScreen & ~collided) # remove the projectiles' existence from the game
+
+    def sweep(self, ground, startx, starty, endx, endy):
+        """Finds where the paths of projectiles from (startx, starty) to (endx, endy) first go into the ground.
+        Gives back whether each path hits the ground and the fraction of the way along it that it does"""
+        count = len(startx)
+        dx, dy = endx-startx, endy-starty
+        # the path and the ground are both straight lines between the start, each column the path crosses and
+        # the end, so checking just those points finds exactly where it crosses. a projectile can only cross 
+        # as many columns as its speed, so that limits how many points need checking
+        direction = np.where(dx < 0, -1, 1)
+        firstColumn = np.where(dx < 0, np.ceil(startx)-1, np.floor(startx)+1)
+        columns = firstColumn[:, None] + direction[:, None]*np.arange(int(np.abs(dx).max())+1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (columns-startx[:, None])/dx[:, None] # fraction of the way along the path that each column is at
+        t = np.clip(np.nan_to_num(t, nan=1, posinf=1, neginf=1), 0, 1) # columns past the end are just the end
+        t = np.hstack((np.zeros((count, 1)), t, np.ones((count, 1))))
+
+        # how far below the ground each point is (NaN where the point is off the ground, which never counts)
+        depth = starty[:, None] + t*dy[:, None] - ground.getHeightsAtPoints(startx[:, None] + t*dx[:, None])
+        below = depth >= 0
+        hit = below.any(axis=1)
+        rows = np.arange(count)
+        after = below.argmax(axis=1)    # first point below the ground
+        before = np.maximum(after-1, 0) # last point above the ground
+        # the line between those two points crosses the ground where the depth is 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = depth[rows, before]/(depth[rows, before]-depth[rows, after])
+        fraction = np.nan_to_num(fraction, nan=1) # if the last point was off the ground, use the first point below it
+        crossing = t[rows, before] + (t[rows, after]-t[rows, before])*fraction
+        return hit, np.where(after == 0, 0, crossing)
+
+    def explode(self, i:int, ground, tanks):
+        """Explodes projectile i where it is, destroying the ground and damaging any tanks it hit"""
+        x, y, radius = round(self.x[i]), round(self.y[i]), int(self.radius[i])
+        ground.destroyAtPoint((x, y), 3*radius) # destroy the ground at the point of impact
+        Explosion(x, ground.getHeightAtPoint(x), 3*radius)
+        rect = pygame.Rect(x-radius, y-radius, 2*radius, 2*radius)
+        for tank in tanks.copy(): # a copy, as a tank removes itself from the list when destroyed
+            if tank.getRect().colliderect(rect): # if the projectile has collided with a tank
+                tank.damage(int(self.damage[i]))   # damage the tank
+
+
+projectiles = ProjectileEngine()
 class Projectile:
     def __init__(self, x, y, radius, angle, power, damage:int=30):
-        """Initialises the projectile with the required parameters"""
+        """Fires a projectile with the required parameters, which the projectile engine then moves"""
         self.x = x
         self.y = y
         self.radius = radius
         self.angle = angle
         self.power = power
         self.damage = damage
-        self.rect = pygame.Rect(x-radius, y-radius, 2*radius, 2*radius)
-
-        self.xvel = (cos(radians(angle))*power)/4 # initial x and y velocities (scaled down by 4 to
-        self.yvel = (sin(radians(angle))*power)/4 # make the projectile travel at a reasonable speed)
-        projectiles.append(self)
+        projectiles.add(x, y, radius, angle, power, damage)
 
     def getData(self): return self.x, self.y, self.radius, self.angle, self.power, self.damage
     def getDamage(self): return self.damage
-    def getRect(self): return self.rect
-    def draw(self, surface): 
-        """Draws the projectile on the given surface"""
-        self.rect = pygame.draw.circle(surface, white, (round(self.x), round(self.y)), self.radius)
-    
-    def update(self, ground, tanks):
-        """Relevant updates to the projectile"""
-        self.move()  
-        self.collide(ground, tanks)
-
-    def collide(self, ground, tanks):
-        """Checks if the projectile is within the screen
-        or has collided with the ground, removing its existence if so"""
-        if self.x <= 0 or self.x >= const["screenwidth"]:
-            projectiles.remove(self)
-            del self
-            return
-
-        if self.y >= ground.getHeightAtPoint(round(self.x)): # if the projectile has collided with the ground
-            ground.destroyAtPoint((round(self.x), round(self.y)), 3*self.radius) # destroy the ground at the point of impact
-            Explosion(round(self.x), ground.getHeightAtPoint(round(self.x)), 3*self.radius)
-            for tank in tanks:
-                if tank.getRect().colliderect(self.rect): # if the projectile has collided with a tank
-                    tank.damage(self.damage)   # damage the tank
-            projectiles.remove(self)
-            del self
-
-    def move(self):
-        """Updates the projectile's position"""
-        self.x += self.xvel # update the x and y coordinates
-        self.y += self.yvel
-        self.yvel += const["gravity"] # simplified v = u + at, where a = gravity to update the y velocity
-
-        if self.y > const["screenheight"]: # if the projectile is below (off of) the screen
-            projectiles.remove(self)  # remove its existence from the game
-            del self
 
 
 explosions = []
@@ -88,14 +199,18 @@ class Explosion:
         self.y = y
         self.maxRadius = maxRadius
         self.radius = 1
+        self.previousRadius = 1 # the radius on the previous tick
         self.drdt = 0.1
         explosions.append(self)
     
-    def draw(self, surface): # draw the explosion
-        pygame.draw.circle(surface, orange, (round(self.x), round(self.y)), round(self.radius))
+    def draw(self, surface, interpolation:float=1):
+        """Draws the explosion interpolation of the way from its size on the previous tick to its size now"""
+        radius = self.previousRadius + (self.radius-self.previousRadius)*interpolation
+        pygame.draw.circle(surface, orange, (round(self.x), round(self.y)), round(radius))
 
     def decay(self, ticks):
         """Decays the explosion circle over time"""
+        self.previousRadius = self.radius
         self.radius += self.drdt*ticks    # change explosion radius
         if self.radius >= self.maxRadius: # if maximum radius is reached
             self.drdt *= -1               # reverse rate of change of radius
@@ -110,7 +225,8 @@ class Barrel:
     def __init__(self, image, angle, power):
         self.angle = angle # random starting values
         self.power = power
-        self.originalimage = pygame.transform.scale(image, (round(const["screenheight"]/26), round(const["screenheight"]/500)))
+        self.originalimage = caches.scale(image, (round(const["screenheight"]/26), round(const["screenheight"]/500)))
+        caches.warmRotations(self.originalimage) # does nothing if another barrel has already used this image
     
         self.image = self.originalimage
         self.rotate(0) # rotate the barrel to the starting angle
@@ -118,7 +234,7 @@ class Barrel:
     def rotate(self, angle):
         self.angle += angle # update the angle
         self.angle %= 360 # make sure the angle is between 0 and 360
-        self.image = pygame.transform.rotate(self.originalimage, -self.angle) # rotate the barrel image
+        self.image = caches.rotate(self.originalimage, -self.angle) # rotate the barrel image
     
     def changepower(self, increment):
         # update the power, ensuring it is between 0 and 100
@@ -127,7 +243,9 @@ class Barrel:
 
 tankg = [] # this is a list
 class Tank: # Tank class that inherits from Centre referencepoint class
-    def __init__(self, x, y, angle=random.randint(0,359), power=random.randint(0,100), baseHealth:int=200, enemy:bool=False, name="Player"): # constructor
+    def __init__(self, x, y, angle=None, power=None, baseHealth:int=200, enemy:bool=False, name="Player"): # constructor
+        if angle is None: angle = rng.randint(0,359) # random starting values
+        if power is None: power = rng.randint(0,100)
         if enemy: 
             image = images.enemy_tank          # selection between usage of enemy or friendly tank images
             barrel = images.enemy_tank_barrel
@@ -140,31 +258,36 @@ class Tank: # Tank class that inherits from Centre referencepoint class
         self.name = name # the player's username
 
         # initialise the tank's image, barrel and rect (collision box)
-        self.originalImage = pygame.transform.scale(image, (round((const["screenheight"]/70)*2.2), round(const["screenheight"]/70)))
+        self.originalImage = caches.scale(image, (round((const["screenheight"]/70)*2.2), round(const["screenheight"]/70)))
         self.image = self.originalImage
         self.rect = self.image.get_rect(center=(x,y+self.image.get_height()//2))
         self.barrel = Barrel(barrel, angle, power)
         self.height = self.rect.height
-        self.font = pygame.font.SysFont("ebrima", 10, bold=True)
+        self.groundAngle = None # the angle of the ground the tank image was last rotated to
+        self.previousCenter = self.tickCenter = self.rect.center # where the tank was after the previous tick and the last one
         self.friendly = not enemy
 
         tankg.append(self) # add tank to list of tanks in game
 
-    def draw(self, surface: pygame.Surface):
+    def draw(self, surface: pygame.Surface, interpolation:float=1):
+        """Draws the tank interpolation of the way from where it was on the previous tick to where it is now"""
+        font = getFont("ebrima", 10, bold=True) # only got when drawing, so tanks can exist without a display
         if 0 <= self.barrel.angle <= 90: angle = -self.barrel.angle   # finnicky maths to make the angle display correctly
         elif 90 < self.barrel.angle <= 270: angle = self.barrel.angle-180
         elif 270 < self.barrel.angle <= 359: angle = 360-self.barrel.angle
-        surface.blit(*render(self.font, f"{self.barrel.power}, {angle}", (self.rect.left+2, self.rect.centery+20))) # display power and angle
-        surface.blit(*render(self.font, f"{self.name}: {self.health}", (self.rect.left-7, self.rect.centery-30))) # display health
-        surface.blit(self.barrel.image, self.barrel.image.get_rect(center=self.rect.center))
-        surface.blit(self.image, self.rect) # draw the tank to a surface
+        rect = self.rect.move(round((self.previousCenter[0]-self.tickCenter[0])*(1-interpolation)),
+                              round((self.previousCenter[1]-self.tickCenter[1])*(1-interpolation)))
+        surface.blit(*render(font, f"{self.barrel.power}, {angle}", (rect.left+2, rect.centery+20))) # display power and angle
+        surface.blit(*render(font, f"{self.name}: {self.health}", (rect.left-7, rect.centery-30))) # display health
+        surface.blit(self.barrel.image, self.barrel.image.get_rect(center=rect.center))
+        surface.blit(self.image, rect) # draw the tank to a surface
 
     def getRect(self): return self.rect
     def isAlive(self): return self.alive
     def getName(self): return self.name
-    def getData(self): return self.rect.centerx, self.rect.centery, self.barrel.angle, self.barrel.power
+    def getData(self): return self.rect.centerx, self.rect.centery, self.barrel.angle, self.barrel.power, self.health
     def setData(self, data): 
-        self.rect.centerx, self.rect.centery, self.barrel.angle, self.barrel.power = data
+        self.rect.centerx, self.rect.centery, self.barrel.angle, self.barrel.power, self.health = data
         self.barrel.rotate(0)
     def shoot(self): # shoot a projectile. this might expand if requried
         return Projectile(self.rect.centerx, self.rect.centery, 5, self.barrel.angle, self.barrel.power)
@@ -175,10 +298,13 @@ class Tank: # Tank class that inherits from Centre referencepoint class
 
     def update(self, ground): 
         """do relevant updates to the tank. this will probably expand"""
-        angle = degrees(atan(ground.getHeightAtPoint(self.rect.centerx)-ground.getHeightAtPoint(self.rect.centerx-1)))
-        self.image = pygame.transform.rotate(self.originalImage, -angle)
-        self.rect = self.image.get_rect(center=self.rect.center)
+        angle = ground.getAngleAtPoint(self.rect.centerx)
+        if angle != self.groundAngle: # only re-rotate the tank if it has moved onto a different angle of ground
+            self.groundAngle = angle
+            self.image = caches.rotate(self.originalImage, -angle)
+            self.rect = self.image.get_rect(center=self.rect.center)
         self.collide(ground)
+        self.previousCenter, self.tickCenter = self.tickCenter, self.rect.center
 
     def damage(self, damage):
         self.health -= damage
@@ -198,49 +324,134 @@ class Tank: # Tank class that inherits from Centre referencepoint class
 
 
 class Ground: # class for the ground
+    smoothMargin = 8 # number of extra columns either side of a crater which get smoothed
+    chaikinKernel = 0.25**np.arange(27) # 0.25^27 is smaller than the precision of a float
+    
     def __init__(self, pointslist): # constructor defining the coordinates of the ground
         self.xcoords = np.array([point[0] for point in pointslist]) # list of x coordinates of the ground
-        self.ycoords = np.array([point[1] for point in pointslist]) # list of y coordinates of the ground
+        self.ycoords = fixed([point[1] for point in pointslist]) # heightmap, indexed by column
+        self.xoffset = int(self.xcoords[0]) # x coordinate of the first column, so a column's index is x-xoffset
+        self.lastColumn = len(self.ycoords)-1
+        self.gradients = np.zeros(len(self.ycoords)) # gradient of the ground between each column and the one before it
+        self.angles = np.zeros(len(self.ycoords))    # angle of the ground at each column, in degrees
+        self.updateSlopes(0, self.lastColumn+1)
+        self.surface = None # cached render of the ground
+        self.dirtyColumns = None # (start, end) of the columns which have changed since the ground was last drawn
+        self.craters = [] # (x, y, radius) of every crater made, in order, so another computer can make them too
 
     def draw(self, surface): 
-        pygame.draw.polygon(surface, light_blue,  # draws the ground to a surface, adding extra points to close the polygon
-                            [[xcoord, ycoord] for xcoord, ycoord in zip(self.xcoords, self.ycoords)]+
-                            [[const["screenwidth"], const["screenheight"]], [0, const["screenheight"]]])
+        """Draws the ground to a surface, only re-rendering the columns which have changed since the last draw"""
+        if self.surface is None: # the ground is rendered once, when it is first drawn
+            self.surface = pygame.Surface((self.lastColumn+1, const["screenheight"]))
+            self.surface.set_colorkey(black) # so whatever is behind the sky still shows
+            self.renderColumns(0, self.lastColumn+1)
+        elif self.dirtyColumns is not None:
+            self.renderColumns(*self.dirtyColumns)
+        self.dirtyColumns = None
+        surface.blit(self.surface, (self.xoffset, 0))
+
+    def renderColumns(self, start:int, end:int):
+        """Renders the ground between two column indexes onto the cached ground surface"""
+        pixels = pygame.surfarray.pixels2d(self.surface) # locks the surface, indexed [x][y]
+        rows = np.arange(pixels.shape[1])
+        pixels[start:end] = np.where(rows >= np.ceil(self.ycoords[start:end])[:, None],
+                                     self.surface.map_rgb(light_blue), self.surface.map_rgb(black))
+        del pixels # unlocks the surface so it can be drawn
+
+    def markDirty(self, start:int, end:int):
+        """Marks the columns between two column indexes as needing to be re-rendered"""
+        if self.dirtyColumns is None: self.dirtyColumns = (start, end)
+        else: self.dirtyColumns = (min(start, self.dirtyColumns[0]), max(end, self.dirtyColumns[1]))
 
     def getHeightAtPoint(self, point): # get the ground height at a point
-        try: return self.ycoords[np.where(self.xcoords == point)[0][0]] # if the point is in the list of points, return the y coordinate
-        except IndexError: return False # if the point is not in the list of points, return False
+        """Gets the ground height at an x coordinate by indexing the heightmap directly,
+        interpolating between neighbouring columns if the point is between them"""
+        index = point-self.xoffset
+        if not 0 <= index <= self.lastColumn: return False # if the point is not on the ground, return False
+        column = int(index)
+        if column == index: return self.ycoords[column]
+        fraction = index-column # subpixel point, so linearly interpolate between the two columns either side
+        return self.ycoords[column]*(1-fraction) + self.ycoords[column+1]*fraction
+
+    def getAngleAtPoint(self, point):
+        """Gets the angle of the ground in degrees at an x coordinate, or 0 if the point is not on the ground"""
+        index = round(point)-self.xoffset
+        if not 0 <= index <= self.lastColumn: return 0
+        return self.angles[index]
+
+    def updateSlopes(self, start:int, end:int):
+        """Recalculates the gradients and angles of the ground for the columns between two column indexes"""
+        end = min(end+1, self.lastColumn+1) # the column after a changed column has a changed gradient too
+        self.gradients[max(start, 1):end] = np.diff(self.ycoords[max(start-1, 0):end]) # the first column stays flat
+        self.angles[start:end] = np.degrees(np.arctan(self.gradients[start:end]))
+
+    def checksum(self):
+        """A number which is the same for two grounds only if they are (almost certainly) exactly the same,
+        so computers can check their ground hasn't drifted apart"""
+        return crc32(self.ycoords.tobytes())
+
+    def getHeightsAtPoints(self, points):
+        """Gets the ground heights at an array of x coordinates in one go, with NaN for points off the ground"""
+        index = np.asarray(points, dtype=float)-self.xoffset
+        offGround = (index < 0) | (index > self.lastColumn)
+        index = np.clip(index, 0, self.lastColumn)
+        column = np.minimum(index.astype(int), self.lastColumn-1) # left column of each point's pair of columns
+        fraction = index-column
+        heights = self.ycoords[column]*(1-fraction) + self.ycoords[column+1]*fraction
+        return np.where(offGround, np.nan, heights)
     
     def destroyAtPoint(self, centre:tuple, radius:int):
         """Destroys the ground at a particular point in a circular radius"""
-        for xcoord, ycoord in zip(self.xcoords, self.ycoords):
-            if ycoord <= centre[1] and centre[0]-radius < xcoord < centre[0]+radius:
-                # get the angle from the vertical (dx/dy) to the ground point from the explosion centre, avoiding division by 0
-                angle = atan((xcoord-centre[0])/(ycoord-centre[1])) if ycoord-centre[1] != 0 else pi/2
-                index = np.where(self.xcoords == xcoord)[0][0]
-
-                self.ycoords[index] = ycoord+radius*(cos(angle)) # crater the ground
-
-                if self.ycoords[index] > const["screenheight"]-64:
-                    self.ycoords[index] = const["screenheight"]-64
-        
-        self.smooth()
+        self.craters.append((round(centre[0]), round(centre[1]), radius))
+        # only the columns within the radius of the explosion can be affected
+        start = max(int(centre[0]-radius)-self.xoffset, 0)
+        end = min(int(centre[0]+radius)-self.xoffset+2, self.lastColumn+1)
+        if start >= end: return
+
+        xcoords = self.xcoords[start:end]
+        ycoords = self.ycoords[start:end] # a view, so changing it changes the heightmap
+        crater = (ycoords <= centre[1]) & (centre[0]-radius < xcoords) & (xcoords < centre[0]+radius)
+
+        # the cos of the angle from the vertical (dx/dy) to each ground point from the explosion centre.
+        # cos(atan(dx/dy)) is worked out as |dy|/sqrt(dx^2+dy^2), as sqrt gives exactly the same answer on 
+        # every computer but atan and cos might not. where dy is 0 the angle is pi/2, so the cos is 0
+        dx = xcoords[crater]-centre[0]
+        dy = ycoords[crater]-centre[1]
+        distance = np.sqrt(dx*dx+dy*dy)
+        cosAngle = np.divide(-dy, distance, out=np.zeros(dy.shape), where=distance != 0)
+
+        # crater the ground, not letting it go below the floor
+        ycoords[crater] = np.minimum(ycoords[crater]+radius*cosAngle, const["screenheight"]-64)
+
+        self.smooth(start, end) # only the cratered columns need smoothing
     
-    def smooth(self):
-        """Smooths the ground surrounding an x coordinate by averaging the y coordinate 
-            of each point with the y coordinate of the point above and below it"""
-        # self.ycoords = self.smoothChaikin(self.xcoords, self.ycoords, 3)
-        self.smoothChaikin(3)
-
-    def smoothChaikin(self, refinements:int=1):
-        """Smooths the ground using a modified version of Chaikin's corner-cutting algorithm"""
+    def smooth(self, start:int=0, end:int=None):
+        """Smooths the ground between two column indexes (and a small margin either side) by 
+            averaging the y coordinate of each point with the y coordinate of the point beside it"""
+        if end is None: end = self.lastColumn+1
+        start, end = max(start-self.smoothMargin, 0), min(end+self.smoothMargin, self.lastColumn+1)
+        self.smoothChaikin(3, start, end)
+        self.ycoords[start:end] = fixed(self.ycoords[start:end])
+        self.updateSlopes(start, end)
+        self.markDirty(start, end)
+
+    def smoothChaikin(self, refinements:int=1, start:int=0, end:int=None):
+        """Smooths the ground using a modified version of Chaikin's corner-cutting algorithm.
+        Each pass is the same as sweeping left to right over the columns from start to end, replacing
+        each point and the next with a 3:1 and 1:3 weighted average of the two, but done with NumPy"""
+        if end is None: end = self.lastColumn+1
+        if end-start < 2: return
+        ycoords = self.ycoords[start:end] # a view, so changing it changes the heightmap
+        length = len(ycoords)
+        # the sweep carries each new point into the next average, so the point entering the average at
+        # column i is 0.75*(sum of 0.25^(i-j)*y[j]) - a convolution with a geometrically decaying kernel.
+        # the weights past chaikinKernel's length are too small to change a float, so it is cut off there
+        kernel = self.chaikinKernel[:length]
+        firstWeights = 0.25**np.arange(1, length+1)
         for _ in range(refinements):
-            for i in range(len(self.xcoords)-1):
-                ay = self.ycoords[i]  # get the y coordinates of the current point and the next point
-                by = self.ycoords[i+1]
-                self.ycoords[i] = ay*0.75+by*0.25   # replace the current and next points with a
-                self.ycoords[i+1] = ay*0.25+by*0.75 # reasonably weighted average of the two points
-
+            carried = 0.75*np.convolve(ycoords, kernel)[:length] + firstWeights*ycoords[0] # the first point is carried in whole
+            ycoords[:-1] = carried[:-1]*0.75+ycoords[1:]*0.25
+            ycoords[-1] = carried[-1]
 
 def generate_ground(groundheight:int, shape:str="longFunc"):
     if shape == "sine": # finnicky sine wave for ground points
@@ -252,6 +463,76 @@ def generate_ground(groundheight:int, shape:str="longFunc"):
                         for x in range(1,const["screenwidth"]+2)])
 
 
+inputNames = ("left", "right", "anticlockwise", "clockwise", "powerup", "powerdown") # controls which can be held down
+
+
+def inputKeys(controls, player:str, inputs:dict):
+    """Maps the key bound to each of a player's ("p1" or "p2") inputs in the controls to (inputs, input name)"""
+    return {controls[player+name]: (inputs, name) for name in inputNames}
+
+
+def packInputs(inputs:dict):
+    """Packs which inputs are held down into one number with a bit for each, to be sent to the server"""
+    return sum(1 << bit for bit, name in enumerate(inputNames) if inputs[name])
+
+
+def unpackInputs(held:int):
+    """Unpacks a number from packInputs back into a dictionary of which inputs are held down"""
+    return {name: bool(held >> bit & 1) for bit, name in enumerate(inputNames)}
+
+
+def applyInputs(tank, inputs:dict, ground):
+    """Does the actions to a tank for each of its inputs which are being held down"""
+    if inputs["left"]:          tank.move(-const["vel"], ground)
+    if inputs["right"]:         tank.move(const["vel"], ground)
+    if inputs["anticlockwise"]: tank.barrel.rotate(-1)
+    if inputs["clockwise"]:     tank.barrel.rotate(1)
+    if inputs["powerup"]:       tank.barrel.changepower(1)
+    if inputs["powerdown"]:     tank.barrel.changepower(-1)
+
+
+def simulateTick(ground, profiler):
+    """Moves the game on by one tick: updates the projectiles, tanks and explosions"""
+    projectiles.update(ground, tankg)
+    profiler.lap("update projectiles")
+    for tank in tankg: tank.update(ground)
+    profiler.lap("update tanks")
+    for explosion in explosions: explosion.decay(tickLength)
+    profiler.lap("update explosions")
+
+
+class Bot:
+    def __init__(self, tank, seed=None):
+        """Plays as a tank without a player, for headless games. It drives a bit, 
+        turns the barrel and power to a random angle and power, then shoots"""
+        self.tank = tank
+        self.random = random.Random(seed)
+        self.inputs = dict.fromkeys(inputNames, False) # which inputs the bot is holding down
+        self.aim()
+
+    def aim(self):
+        """Picks where to drive to and the angle and power to shoot at next"""
+        self.targetx = clamp(self.tank.rect.centerx+self.random.randint(-100, 100), 20, const["screenwidth"]-20)
+        self.targetAngle = self.random.randint(200, 340) # pointing upwards, as y increases down the screen
+        self.targetPower = self.random.randint(40, 100)
+        self.ticksAiming = 0
+
+    def control(self, ground):
+        """Decides which inputs to hold down this tick, giving back whether to shoot"""
+        angleDifference = (self.targetAngle-self.tank.barrel.angle+180)%360-180 # the shortest way round
+        self.inputs["left"] = self.tank.rect.centerx > self.targetx
+        self.inputs["right"] = self.tank.rect.centerx < self.targetx
+        self.inputs["anticlockwise"] = angleDifference < 0
+        self.inputs["clockwise"] = angleDifference > 0
+        self.inputs["powerup"] = self.tank.barrel.power < self.targetPower
+        self.inputs["powerdown"] = self.tank.barrel.power > self.targetPower
+
+        self.ticksAiming += 1
+        if any(self.inputs.values()) and self.ticksAiming < 300: return False # give up if the ground is too steep to drive
+        self.aim()
+        return True
+
+
 def printDict(dic):
     print("{")
     for index in dic:
@@ -263,36 +544,67 @@ def printDict(dic):
 
 
 class LANGame:
-    def requestInfo(self):
-        self.prevProjectileInfo = []
-        while True:
-            # get the player and projectile data from the server
-            if self.host:
-                self.playerInfo = self.server.getPlayerData()
-                self.projectileInfo = self.server.getProjectileData()
-            else:
-                self.playerInfo = eval(self.client.getPlayerData())
-                self.projectileInfo = eval(self.client.getProjectileData())
-            
+    def exchange(self, ticks):
+        """Sends the (sequence number, inputs held down, shots) of each tick since the last exchange to the server,
+        and gets back what has happened in the server's game. This is run by the sender's background thread, so it
+        only queues what it gets for the game loop to add to the game, rather than changing the game itself"""
+        # only the players that have changed since the last state version seen are sent back, and only
+        # the projectiles fired and craters made since the last ones seen. if there are no new ticks, the
+        # last one is sent again to say who this is, which the server ignores as it already has it
+        if ticks: self.lastInput = ticks[-1]
+        else: ticks = [self.lastInput]
+        (self.playerVersion, players, self.projectileCursor, newProjectiles, self.craterCursor, craters, acknowledged) = self.client.exchangeInputs(
+            self.username, [(held, shots) for _, held, shots in ticks], ticks[0][0], self.playerVersion, self.projectileCursor, self.craterCursor)
+        self.updates.append((perf_counter(), players, newProjectiles, craters, acknowledged))
+
+    def applyUpdates(self, ground):
+        """Adds everything the server has sent since the last tick to the game. This is run by the game loop,
+        so the game is never changed while it is being simulated or drawn"""
+        while self.updates:
+            received, players, newProjectiles, craters, acknowledged = self.updates.popleft()
+            self.playerInfo.update(players)
+            self.serverState = (acknowledged, self.playerInfo.get(self.username)) # the player's own tank is reconciled with this
+            self.interpolator.add(self.playerInfo, received) # every player, as the ones that haven't changed are still there
+
             # if the dictionary of players has changed, add the new players to the game
             if len(self.playerInfo) > len(self.prevPlayerInfo):
                 prevPlayerInfoKeys = list(self.prevPlayerInfo.keys())
                 playerInfoKeys = list(self.playerInfo.keys())
                 for key in playerInfoKeys:
                     if key not in prevPlayerInfoKeys:
-                        Tank(*list(self.playerInfo[key].values()), enemy=True, name=key)
+                        Tank(*self.playerInfo[key], enemy=True, name=key)
                 self.prevPlayerInfo = self.playerInfo.copy() # .copy() to make an actual copy as opposed to a reference
 
-            # if the list of projectiles has changed, add the new projectiles to the game
-            if len(self.projectileInfo) > len(self.prevProjectileInfo):
-                newProjectileData = self.projectileInfo[len(self.prevProjectileInfo):]
-                for projectile in newProjectileData:
-                    Projectile(*projectile)
-                self.prevProjectileInfo = self.projectileInfo.copy()
-            sleep(0.1) # wait 0.1 seconds before requesting data again to not overload the server
-
-    def __init__(self, screen: pygame.Surface, controls, data):
+            # add the new projectiles and craters to the game. the projectiles are only for show, as the server says where they explode
+            for projectile in newProjectiles:
+                Projectile(*projectile)
+            for x, y, radius in craters:
+                ground.destroyAtPoint((x, y), radius)
+                Explosion(x, ground.getHeightAtPoint(x), radius)
+
+    def reconcile(self, player, ground):
+        """Checks where the predictions put the player's tank against where the server last said it was. If they
+        disagree, the tank is put where the server says, and the inputs the server hasn't used yet are done again.
+        This is run by the game loop after applyUpdates, so the tank is never moved while it is being simulated or drawn"""
+        acknowledged, state = self.serverState
+        if acknowledged <= self.reconciled or state is None: return
+        self.reconciled = acknowledged
+        while self.predictions and self.predictions[0][0] < acknowledged: self.predictions.popleft()
+        if self.predictions and self.predictions[0][0] == acknowledged and self.predictions[0][2] == state: return
+
+        player.setData(state)
+        for index, (sequence, held, data) in enumerate(self.predictions):
+            if sequence <= acknowledged: continue
+            if player.health > 0: applyInputs(player, unpackInputs(held), ground) # the server ignores a destroyed tank's inputs
+            player.update(ground)
+            self.predictions[index] = (sequence, held, player.getData())
+
+    def __init__(self, screen: pygame.Surface, controls, data, maxTicks:int=None):
+        """Plays a LAN game. If screen is None, the game is headless: nothing is drawn and 
+        a bot plays instead of the keyboard, until maxTicks ticks have been simulated.
+        The host's server runs the game, and every player just sends it their inputs"""
         username, self.ip, self.host = data
+        self.username = username
         DEBUG_INFO = False
         SHOW_HITBOXES = False
 
@@ -303,108 +615,161 @@ class LANGame:
             serverThread.start()  # start server in a separate thread to prevent hanging
         else: self.client = Client(self.ip, 8000) # if not host, start the client
 
-        font = pygame.font.SysFont("ebrima", 15, True)
-        clock = pygame.time.Clock()
+        clock = FramePacer(const["fps"])
+        profiler = FrameProfiler()
         groundheight = const["screenheight"]//6
         ground = generate_ground(groundheight, "longFunc")
 
-        player1 = Tank(random.randrange(50, const["screenwidth"]-50), 
-                       const["screenheight"]-groundheight, enemy=False, name=username)
-        p1movingleft = False
-        p1movingright = False
-        p1rotateleft = False
-        p1rotateright = False
-        p1powerup = False
-        p1powerdown = False
-
         # add yourself to the server
-        if self.host: self.server.addPlayer(username, player1.getData())
-        else: self.client.addPlayer(username, *player1.getData())
-
-        self.playerInfo = {}
-        self.projectileInfo = []
-        # establish initial dictionary of previous users to compare to "downloaded" dictionary of users
-        self.prevPlayerInfo = {username: {index:value for index,value in enumerate(player1.getData())}}
-        self.prevProjectileInfo = []
-
-        self.dataThread = threading.Thread(target=self.requestInfo, daemon=True)
-        self.dataThread.start()
+        x, y = rng.randrange(50, const["screenwidth"]-50), const["screenheight"]-groundheight
+        if self.host:
+            # the server's game is in this game's tanks, projectiles and explosions, so the host just draws them
+            self.server.startSimulation(ground)
+            player1 = self.server.addPlayer(username, (x, y), enemy=False)
+        else:
+            player1 = Tank(x, y, enemy=False, name=username)
+            self.client.addPlayer(username, *player1.getData())
+        p1inputs = dict.fromkeys(inputNames, False) # which of the player's controls are being held down
+        self.shots = 0 # number of times the player has shot since their inputs were last sent
+        if screen is None: bot = Bot(player1)
+        else:
+            font = getFont("ebrima", 15, True)
+            keys = inputKeys(controls, "p1", p1inputs)
 
+        if self.host: drawLock = self.server.simulationLock # stops the server changing the game while it is drawn
+        else:
+            drawLock = nullcontext() # only the game loop changes the game, the sender's thread just queues updates for it
+            self.updates = deque() # (time received, players, projectiles, craters, last tick used) got from the server but not added yet
+            self.playerInfo = {}
+            self.playerVersion = 0 # the server's state version the player info is up to date with
+            self.projectileCursor = 0 # sequence number of the last projectile got from the server
+            self.craterCursor = 0 # number of the server's craters which have been got
+            self.inputSequence = 0 # sequence number of the last tick's inputs
+            self.lastInput = (0, 0, 0) # the last tick's (sequence number, inputs held down, shots) sent to the server
+            # the player's own tank moves as soon as a key is pressed, rather than when the server says so. the inputs
+            # of each tick the server hasn't used yet are kept, along with where they put the tank, so when the server
+            # says it is somewhere else, the tank can be put there and those inputs done again on top
+            self.predictions = deque(maxlen=5*const["tickrate"]) # (sequence number, inputs held down, player's data)
+            self.serverState = (0, None) # (sequence number of the last tick the server has used, player's data then)
+            self.reconciled = 0 # sequence number of the last tick the predictions were checked against the server
+            # other players are shown a short delay behind, so they move smoothly between the server's snapshots
+            self.interpolator = Interpolator(const["interpolationdelay"], const["extrapolationlimit"])
+            # establish initial dictionary of previous users to compare to "downloaded" dictionary of users
+            self.prevPlayerInfo = {username: player1.getData()}
+            projectiles.explodes = False # the server says where projectiles explode
+
+            # exchanges data with the server in the background at the send rate, so the game never waits for the network
+            # at most 2 seconds of inputs are sent at once, and only the last few seconds are kept if the server can't be reached
+            self.sender = Sender(self.exchange, const["sendrate"], 2*const["tickrate"], self.predictions.maxlen)
+            self.sender.start()
+
+        accumulator = 0 # milliseconds of game time which haven't been simulated yet
+        tick = 0
         running = True
         while running:
             # framerate limiter
-            ticks = clock.tick_busy_loop(const["fps"])
+            accumulator += min(clock.tick(), maxFrameTime)
+            profiler.newFrame()
 
             # get events which have occurred in a given frame
-            for event in pygame.event.get():
+            for event in pygame.event.get() if screen is not None else ():
                 if   event.type == QUIT: running = False # red X button pressed
                 elif event.type == KEYDOWN:
                     # if a key is pressed down, do the corresponding action to the player
                     if   event.key == K_ESCAPE: running = False
-                    elif event.key == K_F1: DEBUG_INFO = not DEBUG_INFO
-                    elif event.key == controls["p1powerup"]:       p1powerup = True
-                    elif event.key == controls["p1powerdown"]:     p1powerdown = True
-                    elif event.key == controls["p1anticlockwise"]: p1rotateleft = True
-                    elif event.key == controls["p1clockwise"]:     p1rotateright = True
-                    elif event.key == controls["p1left"]:          p1movingleft  = True
-                    elif event.key == controls["p1right"]:         p1movingright = True
-                    elif event.key == controls["p1shoot"] and player1.isAlive(): 
-                        projectile = player1.shoot()
-                        # add the projectile to the server
-                        if self.host: self.server.addProjectile(projectile.getData())
-                        else: self.client.addProjectile(*projectile.getData())
-                        # appending the projectile data prevents the projectile being initialised twice on client computers
-                        self.prevProjectileInfo.append(projectile.getData())
+                    elif event.key == K_F1: DEBUG_INFO = not DEBUG_INFO; profiler.toggle()
+                    elif event.key == K_F2 and DEBUG_INFO: profiler.exportTrace() # save the profiled frames
+                    elif event.key == controls["p1shoot"] and player1.isAlive(): self.shots += 1
+                    elif event.key in keys: 
+                        inputs, name = keys[event.key]
+                        inputs[name] = True
                 elif event.type == KEYUP:
                     # if a key is released, stop doing the corresponding action to the player
-                    if   event.key == controls["p1powerup"]:       p1powerup = False
-                    elif event.key == controls["p1powerdown"]:     p1powerdown = False
-                    elif event.key == controls["p1anticlockwise"]: p1rotateleft = False
-                    elif event.key == controls["p1clockwise"]:     p1rotateright = False
-                    elif event.key == controls["p1left"]:          p1movingleft  = False
-                    elif event.key == controls["p1right"]:         p1movingright = False
+                    if event.key in keys: 
+                        inputs, name = keys[event.key]
+                        inputs[name] = False
+            profiler.lap("events")
             
-            # execute relevant actions to the player
-            if p1movingleft:  player1.move(-const["vel"], ground)
-            if p1movingright: player1.move(const["vel"], ground)
-            if p1rotateleft:  player1.barrel.rotate(-1)
-            if p1rotateright: player1.barrel.rotate(1)
-            if p1powerup:     player1.barrel.changepower(1)
-            if p1powerdown:   player1.barrel.changepower(-1)
-
-            # send new/updated player data to the server
-            if self.host: self.server.sendPlayerData(username, player1.getData())
-            else:    self.client.sendPlayerData(username, *player1.getData())
+            # simulate as many fixed-length ticks as have built up since the last frame
+            while accumulator >= tickLength:
+                accumulator -= tickLength
+                tick += 1
+                if maxTicks and tick >= maxTicks: running = False
+
+                # send the player's inputs to the server, which moves their tank
+                if screen is None and player1.isAlive() and bot.control(ground): self.shots += 1
+                held = packInputs(bot.inputs if screen is None else p1inputs)
+                shots, self.shots = self.shots, 0
+                if self.host:
+                    self.server.sendInputs(username, [(held, shots)])
+                    profiler.lap("input")
+                    continue # the server updates everything
+                self.inputSequence += 1
+                self.sender.queue((self.inputSequence, held, shots)) # every tick's inputs are sent, so they can be replayed
+                profiler.lap("input")
+
+                # add what the server has sent, then move the other tanks to where the server says they are
+                self.applyUpdates(ground)
+                profiler.lap("network")
+                self.reconcile(player1, ground)
+                profiler.lap("reconcile")
+                for tank in tankg.copy(): # a copy, as a tank removes itself from the list when destroyed
+                    if tank != player1:
+                        data = self.interpolator.get(tank.getName())
+                        if data is not None: tank.setData(data)
+                    if tank.health <= 0: tank.damage(0) # the server's tank has been destroyed
+                profiler.lap("interpolate")
+
+                # predict the player's own tank by doing their inputs straight away, as the server will
+                if player1.isAlive(): applyInputs(player1, unpackInputs(held), ground)
+                profiler.lap("predict")
+                simulateTick(ground, profiler)
+                self.predictions.append((self.inputSequence, held, player1.getData()))
+
+            if screen is None: continue # nothing to draw when headless
 
             screen.fill(black)
 
-            # update and draw projectiles
-            for projectile in projectiles: 
-                projectile.update(ground, tankg)
-                projectile.draw(screen)
-            
-            ground.draw(screen)
-
-            # update and draw tanks
-            for tank in tankg: 
-                if tank != player1:
-                    tank.setData(list(self.playerInfo[tank.getName()].values()))
-                tank.update(ground)
-                if SHOW_HITBOXES: pygame.draw.polygon(screen, (255,255,255), (tank.rect.topleft, tank.rect.topright, tank.rect.bottomright, tank.rect.bottomleft), 1)
-                tank.draw(screen)
-
-            # update and draw explosions
-            for explosion in explosions:
-                explosion.decay(ticks)
-                explosion.draw(screen)
+            with drawLock:
+                # draw everything part of the way from the previous tick to the last one, so it moves smoothly.
+                # the host's game is ticked by the server's clock, not this loop's, so it goes by when that last ticked
+                if self.host: interpolation = min((perf_counter()-self.server.lastTick)*1000/tickLength, 1)
+                else: interpolation = accumulator/tickLength
+                projectiles.draw(screen, interpolation)
+                profiler.lap("draw projectiles")
+                
+                ground.draw(screen)
+                profiler.lap("draw ground")
+
+                # draw tanks
+                for tank in tankg: 
+                    if SHOW_HITBOXES: pygame.draw.polygon(screen, (255,255,255), (tank.rect.topleft, tank.rect.topright, tank.rect.bottomright, tank.rect.bottomleft), 1)
+                    tank.draw(screen, interpolation)
+                profiler.lap("draw tanks")
+
+                # draw explosions
+                for explosion in explosions:
+                    explosion.draw(screen, interpolation)
+                profiler.lap("draw explosions")
 
             if DEBUG_INFO:
-                screen.blit(*render(font, f"FPS: {clock.get_fps()}", (0,0)))
+                drawDebugInfo(screen, font, clock, profiler, ground)
                 # screen.blit(*render(font, f"Angle: {player1.barrel.angle}", (0,15)))
                 # screen.blit(*render(font, f"Power: {player1.barrel.power}", (0,30)))
+            profiler.lap("debug")
 
             pygame.display.flip()
+            profiler.lap("flip")
+        if self.host:
+            self.server.stopSimulation()
+            self.server.stop()
+        else:
+            self.sender.stop() # waits for an exchange in progress, so it can't add to the game after it is cleared
+            self.client.stop()
+            projectiles.explodes = True
         tankg.clear()
+        projectiles.clear() # the server's projectiles which were still in the air
+        explosions.clear()
 
 
 def game(screen: pygame.Surface, controls, localMultiplayer=False, lanMultiplayer=False):
@@ -412,117 +777,130 @@ def game(screen: pygame.Surface, controls, localMultiplayer=False, lanMultiplaye
     DEBUG_INFO = False
     SHOW_HITBOXES = False
 
-    font = pygame.font.SysFont("ebrima", 15, True)
-    clock = pygame.time.Clock()
+    font = getFont("ebrima", 15, True)
+    clock = FramePacer(const["fps"])
+    profiler = FrameProfiler()
 
     groundheight = const["screenheight"]//6
 
     player1 = Tank(const["screenwidth"]//4, const["screenheight"]-groundheight, enemy=False)
+    p1inputs = dict.fromkeys(inputNames, False) # which of each player's controls are being held down
+    keys = inputKeys(controls, "p1", p1inputs)  # which player's input each key controls
     if localMultiplayer:
         player2 = Tank(3*(const["screenwidth"]//4), const["screenheight"]-groundheight, enemy=True)
-    
-    p1movingleft = False
-    p1movingright = False
-    p1rotateleft = False
-    p1rotateright = False
-    p1powerup = False
-    p1powerdown = False
-
-    p2movingleft = False
-    p2movingright = False
-    p2rotateleft = False
-    p2rotateright = False
-    p2powerup = False
-    p2powerdown = False
+        p2inputs = dict.fromkeys(inputNames, False)
+        keys.update(inputKeys(controls, "p2", p2inputs))
 
     ground = generate_ground(groundheight, "longFunc")
 
+    accumulator = 0 # milliseconds of game time which haven't been simulated yet
     running = True
     while running:
-        ticks = clock.tick_busy_loop(const["fps"])
+        accumulator += min(clock.tick(), maxFrameTime)
+        profiler.newFrame()
 
         for event in pygame.event.get():
             if   event.type == QUIT: running = False
             elif event.type == KEYDOWN:
                 if   event.key == K_ESCAPE: running = False
-                elif event.key == K_F1: DEBUG_INFO = not DEBUG_INFO
-                elif event.key == controls["p1powerup"]:       p1powerup = True
-                elif event.key == controls["p1powerdown"]:     p1powerdown = True
-                elif event.key == controls["p1anticlockwise"]: p1rotateleft = True
-                elif event.key == controls["p1clockwise"]:     p1rotateright = True
-                elif event.key == controls["p1left"]:          p1movingleft  = True
-                elif event.key == controls["p1right"]:         p1movingright = True
+                elif event.key == K_F1: DEBUG_INFO = not DEBUG_INFO; profiler.toggle()
+                elif event.key == K_F2 and DEBUG_INFO: profiler.exportTrace() # save the profiled frames
                 elif event.key == controls["p1shoot"] and player1.isAlive(): player1.shoot()
-                if localMultiplayer:
-                    if   event.key == controls["p2powerup"]:       p2powerup = True
-                    elif event.key == controls["p2powerdown"]:     p2powerdown = True
-                    elif event.key == controls["p2anticlockwise"]: p2rotateleft = True
-                    elif event.key == controls["p2clockwise"]:     p2rotateright = True
-                    elif event.key == controls["p2left"]:          p2movingleft  = True
-                    elif event.key == controls["p2right"]:         p2movingright = True
-                    elif event.key == controls["p2shoot"] and player2.isAlive(): player2.shoot()
+                elif localMultiplayer and event.key == controls["p2shoot"] and player2.isAlive(): player2.shoot()
+                elif event.key in keys: 
+                    inputs, name = keys[event.key]
+                    inputs[name] = True
             elif event.type == KEYUP:
-                if   event.key == controls["p1powerup"]:       p1powerup = False
-                elif event.key == controls["p1powerdown"]:     p1powerdown = False
-                elif event.key == controls["p1anticlockwise"]: p1rotateleft = False
-                elif event.key == controls["p1clockwise"]:     p1rotateright = False
-                elif event.key == controls["p1left"]:          p1movingleft  = False
-                elif event.key == controls["p1right"]:         p1movingright = False
-                if localMultiplayer:
-                    if   event.key == controls["p2powerup"]:       p2powerup = False
-                    elif event.key == controls["p2powerdown"]:     p2powerdown = False
-                    elif event.key == controls["p2anticlockwise"]: p2rotateleft = False
-                    elif event.key == controls["p2clockwise"]:     p2rotateright = False
-                    elif event.key == controls["p2left"]:          p2movingleft  = False
-                    elif event.key == controls["p2right"]:         p2movingright = False
+                if event.key in keys: 
+                    inputs, name = keys[event.key]
+                    inputs[name] = False
+        profiler.lap("events")
         
-        if p1movingleft:  player1.move(-const["vel"], ground)
-        if p1movingright: player1.move(const["vel"], ground)
-        if p1rotateleft:  player1.barrel.rotate(-1)
-        if p1rotateright: player1.barrel.rotate(1)
-        if p1powerup:     player1.barrel.changepower(1)
-        if p1powerdown:   player1.barrel.changepower(-1)
-
-        if p2movingleft:  player2.move(-const["vel"], ground)
-        if p2movingright: player2.move(const["vel"], ground)
-        if p2rotateleft:  player2.barrel.rotate(-1)
-        if p2rotateright: player2.barrel.rotate(1)
-        if p2powerup:     player2.barrel.changepower(1)
-        if p2powerdown:   player2.barrel.changepower(-1)
+        while accumulator >= tickLength: # simulate as many fixed-length ticks as have built up since the last frame
+            accumulator -= tickLength
+
+            applyInputs(player1, p1inputs, ground)
+            if localMultiplayer: applyInputs(player2, p2inputs, ground)
+            profiler.lap("input")
+
+            simulateTick(ground, profiler)
 
         screen.fill(black)
-        for projectile in projectiles: 
-            projectile.update(ground, tankg)
-            projectile.draw(screen)
+        interpolation = accumulator/tickLength # everything is drawn part of the way from the previous tick to the last one
+        projectiles.draw(screen, interpolation)
+        profiler.lap("draw projectiles")
         
         ground.draw(screen)
+        profiler.lap("draw ground")
 
         for tank in tankg: 
-            tank.update(ground)
             if SHOW_HITBOXES: pygame.draw.polygon(screen, (255,255,255), (tank.rect.topleft, tank.rect.topright, tank.rect.bottomright, tank.rect.bottomleft), 1)
-            tank.draw(screen)
+            tank.draw(screen, interpolation)
+        profiler.lap("draw tanks")
 
         for explosion in explosions:
-            explosion.decay(ticks)
-            explosion.draw(screen)
+            explosion.draw(screen, interpolation)
+        profiler.lap("draw explosions")
 
         if DEBUG_INFO:
-            screen.blit(*render(font, f"FPS: {clock.get_fps()}", (0,0)))
+            drawDebugInfo(screen, font, clock, profiler, ground)
             # screen.blit(*render(font, f"Angle: {tank.barrel.angle}", (0,15)))
             # screen.blit(*render(font, f"Power: {tank.barrel.power}", (0,30)))
+        profiler.lap("debug")
 
         pygame.display.flip()
+        profiler.lap("flip")
+    tankg.clear()
+
+
+def headlessGame(players:int=2, maxTicks:int=60*const["tickrate"], seed=None, profiler:FrameProfiler=None):
+    """Plays a match between bots without a window (or any pygame display at all), as fast as the 
+    simulation can run, for benchmarks and testing. It uses the same code as game() to simulate each tick,
+    timing each tick with profiler if it is enabled. Gives back the number of ticks simulated, the seconds
+    it took, each tank's health at the end and the ground's checksum, which are the same for the same seed"""
+    if profiler is None: profiler = FrameProfiler()
+    seedGame(seed)
+    groundheight = const["screenheight"]//6
+    ground = generate_ground(groundheight, "longFunc")
+    bots = [Bot(Tank(rng.randrange(50, const["screenwidth"]-50), const["screenheight"]-groundheight, 
+                     enemy=i > 0, name=f"Bot {i+1}"), rng.random()) for i in range(players)]
+
+    start = perf_counter()
+    for tick in range(1, maxTicks+1):
+        profiler.newFrame()
+        for bot in bots:
+            if bot.tank.isAlive() and bot.control(ground): bot.tank.shoot()
+            if bot.tank.isAlive(): applyInputs(bot.tank, bot.inputs, ground)
+        profiler.lap("input")
+        simulateTick(ground, profiler)
+        if len(tankg) <= 1 and not len(projectiles): break # the match is over once there's one tank left
+    duration = perf_counter()-start
+
+    results = {bot.tank.getName(): max(bot.tank.health, 0) for bot in bots}
     tankg.clear()
+    projectiles.clear()
+    explosions.clear()
+    return tick, duration, results, ground.checksum()
 
 
 def render(font, text: str, loc: tuple):
     """Renders text to a surface and returns the text surface and text rect
     Usage: screen.blit(*render(font, "Hello World!", (0,0)))"""
-    textsurf = font.render(text, True, white)
+    textsurf = caches.renderText(font, text, white)
     textrect = textsurf.get_rect(topleft=loc)
     return textsurf, textrect
 
 
+def drawDebugInfo(surface, font, clock, profiler, ground):
+    """Draws the frame rate, cache statistics and the time each part of the game loop takes (F2 saves them)"""
+    surface.blit(*render(font, f"FPS: {clock.getFps()}", (0,0)))
+    surface.blit(*render(font, f"Text cache: {caches.renderedText.hits} hits, {caches.renderedText.misses} misses", (0,15)))
+    surface.blit(*render(font, "Frame time: {:.2f}ms, jitter {:.2f}ms (worst {:.2f}ms)".format(*clock.getJitter()), (0,30)))
+    surface.blit(*render(font, f"Ground checksum: {ground.checksum():08x}", (0,45)))
+    for i, (name, mean, p99) in enumerate(profiler.getStats()):
+        surface.blit(*render(font, f"{name}: {mean:.2f}ms, p99 {p99:.2f}ms", (0,60+15*i)))
+
+
 # def LANgame(screen: pygame.Surface, controls, data):
 #     username, ip, host = data
 #     DEBUG_INFO = False
@@ -536,7 +914,7 @@ def render(font, text: str, loc: tuple):
 #         serverThread.start()  # start server in a separate thread to prevent hanging
 #     else: client = Client(ip, 8000) # if not host, start the client
 
-#     font = pygame.font.SysFont("ebrima", 15, True)
+#     font = getFont("ebrima", 15, True)
 #     clock = pygame.time.Clock()
 #     groundheight = const["screenheight"]//6
 #     ground = generate_ground(groundheight, "longFunc")
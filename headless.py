@@ -0,0 +1,45 @@
+"""
+Plays games between bots without a window, for benchmarks, regression testing and bot-vs-bot games
+on computers without a display. Local games run as fast as possible, LAN games run in real time.
+
+Usage: python headless.py [--players 2] [--ticks 3600] [--seed 0] [--matches 1] [--profile]
+       python headless.py --lan (--host | --join IP) [--name Bot] [--ticks 3600]
+"""
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # nothing should use the display, but just in case
+import argparse
+from profiler import FrameProfiler
+from game import headlessGame, LANGame, const
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays games between bots without a window")
+    parser.add_argument("--players", type=int, default=2, help="number of bots in a local game")
+    parser.add_argument("--ticks", type=int, default=60*const["tickrate"], help="most ticks to simulate per game")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the bots and tank positions")
+    parser.add_argument("--matches", type=int, default=1, help="number of local games to play")
+    parser.add_argument("--profile", action="store_true", help="print how long each part of a tick takes")
+    parser.add_argument("--lan", action="store_true", help="play a LAN game as a bot instead")
+    parser.add_argument("--host", action="store_true", help="host the LAN game")
+    parser.add_argument("--join", metavar="IP", default="", help="IP address of the LAN game's host")
+    parser.add_argument("--name", default="Bot", help="username in the LAN game")
+    args = parser.parse_args()
+
+    if args.lan:
+        LANGame(None, None, (args.name, args.join, args.host), maxTicks=args.ticks)
+        return
+
+    for match in range(args.matches):
+        profiler = FrameProfiler()
+        if args.profile: profiler.toggle()
+        seed = None if args.seed is None else args.seed+match
+        ticks, duration, results, checksum = headlessGame(args.players, args.ticks, seed, profiler)
+        print(f"Match {match+1}: {ticks} ticks in {duration:.2f}s ({ticks/duration:.0f} ticks/s, "
+              f"{ticks/const['tickrate']/duration:.1f}x real time) - {results}, ground checksum {checksum:08x}")
+        for name, mean, p99 in profiler.getStats():
+            print(f"    {name}: {mean:.3f}ms, p99 {p99:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 from os.path import join
 from pygame.image import load
+from pygame.display import get_surface
 
 friendly_tank = load(join("images", "green-tank.png"))
 friendly_tank_barrel = load(join("images", "green-barrel.png"))
 enemy_tank = load(join("images", "red-tank.png"))
 enemy_tank_barrel = load(join("images", "red-barrel.png"))
 
-explosion = load(join("images", "explosion.png")).convert_alpha()
\ No newline at end of file
+explosion = load(join("images", "explosion.png"))
+if get_surface(): explosion = explosion.convert_alpha() # can only be converted once there is a window (not when headless)
\ No newline at end of file
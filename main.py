@@ -15,11 +15,13 @@ except ModuleNotFoundError:
     except: 
         os.system("python main.py")
         exit()
+from fonts import preloadFonts
 with open("constants.json", "r") as constants: const = json.load(constants)
 
 
 def main(): # main function
     pygame.init() # initialise pygame
+    preloadFonts([("ebrima", 10, True), ("ebrima", 15, True)]) # load the in-game fonts while the menu is open
     
     FULLSCREEN = True
 
@@ -3,6 +3,8 @@ import controls
 from colours import *
 from keychars import *
 from client import Client
+from fonts import getFont
+from caches import renderText
 from server import Server
 from types import FunctionType
 from pygame.locals import QUIT, K_ESCAPE, KEYDOWN, KEYUP, MOUSEMOTION, MOUSEBUTTONDOWN, K_LSHIFT, K_RSHIFT, K_CAPSLOCK
@@ -24,8 +26,7 @@ class MenuComponent(pygame.Surface): # inheriting from pygame.Surface, which is
         self.textsize = textsize       # the size of the text
         self.textcolour = textcolour   # the colour of the text
 
-        if font[-4:] == ".ttf": self.font = pygame.font.Font(font, textsize); self.font.set_bold(True)
-        else: self.font = pygame.font.SysFont(font, textsize, bold=True) # initialise text font
+        self.font = getFont(font, textsize, bold=True) # initialise text font, shared with any other component using it
         self.fill(self.bgcolour) # fill the background of the component
         self.textRender() # render the text onto the component surface
         
@@ -64,7 +65,7 @@ class MenuComponent(pygame.Surface): # inheriting from pygame.Surface, which is
     def textRender(self): # this renders the text onto the component's surface in an editable 
         self.fill(self.bgcolour) # fill the background of the component
         componentSize = self.get_size() # gets the dimensions of the component surface
-        textsurf = self.font.render(self.text, True, self.textcolour) # creates a surface of the text
+        textsurf = renderText(self.font, self.text, self.textcolour) # creates (or reuses) a surface of the text
         self.blit(textsurf, # draws the text surface onto the component surface
                   textsurf.get_rect(center=((componentSize[0]//2)-1, 
                                             (componentSize[1]//2)-1) # -1 to centre it. it seems to work for all sizes...
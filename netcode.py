@@ -0,0 +1,79 @@
+"""
+Smooths out other players' tanks, which the server only sends a few times a second, by showing them a short
+delay behind real time and interpolating between the snapshots either side of that time
+"""
+
+import threading
+from collections import deque
+from time import perf_counter
+
+
+def lerp(start, end, fraction):
+    return start+(end-start)*fraction
+
+
+def lerpAngle(start, end, fraction):
+    """Interpolates between two angles in degrees the shortest way round"""
+    return (start+((end-start+180)%360-180)*fraction)%360
+
+
+def blend(before:tuple, after:tuple, fraction:float):
+    """Interpolates a player's (x, y, angle, power, health) fraction of the way from one snapshot to another.
+    fraction can be more than 1 to extrapolate. Health isn't interpolated, it changes when after is reached"""
+    x, y, angle, power, health = before
+    x2, y2, angle2, power2, health2 = after
+    return (round(lerp(x, x2, fraction)), round(lerp(y, y2, fraction)), round(lerpAngle(angle, angle2, fraction))%360,
+            round(min(max(lerp(power, power2, fraction), 0), 100)), health2 if fraction >= 1 else health)
+
+
+class SnapshotBuffer:
+    def __init__(self, size:int=32):
+        """The last size snapshots of a player, as (time received, data)"""
+        self.snapshots = deque(maxlen=size) # a ring buffer, the oldest snapshot is dropped when a new one is added
+
+    def add(self, time:float, data:tuple):
+        if self.snapshots and time <= self.snapshots[-1][0]: return # out of order, or a repeat
+        self.snapshots.append((time, data))
+
+    def sample(self, time:float, maxExtrapolation:float):
+        """The player's data at a time, interpolated between the snapshots either side of it. After the newest
+        snapshot, it carries on moving the way it was for up to maxExtrapolation seconds, in case a packet is late"""
+        snapshots = self.snapshots
+        if not snapshots: return None
+        if len(snapshots) == 1 or time <= snapshots[0][0]: return snapshots[0][1]
+
+        if time >= snapshots[-1][0]: # extrapolate from the last two snapshots
+            (beforeTime, before), (afterTime, after) = snapshots[-2], snapshots[-1]
+            time = min(time, afterTime+maxExtrapolation)
+        else:
+            for index in range(len(snapshots)-1, 0, -1): # the wanted time is usually near the newest snapshots
+                if snapshots[index-1][0] <= time: break
+            (beforeTime, before), (afterTime, after) = snapshots[index-1], snapshots[index]
+        return blend(before, after, (time-beforeTime)/(afterTime-beforeTime))
+
+
+class Interpolator:
+    def __init__(self, delay:float=0.1, maxExtrapolation:float=0.25, size:int=32):
+        """Keeps a SnapshotBuffer for each player and gives back where they are delay seconds in the past.
+        The delay should be at least two send intervals, so there is almost always a snapshot after that time"""
+        self.delay = delay
+        self.maxExtrapolation = maxExtrapolation
+        self.size = size
+        self.buffers = {} # name: SnapshotBuffer
+        self.lock = threading.Lock() # so snapshots can be added by a different thread than the one getting them
+
+    def add(self, players:dict, time:float=None):
+        """Adds a snapshot of every player in a dictionary of {name: (x, y, angle, power, health)}, received at time.
+        Players that haven't changed should still be added, otherwise they would be extrapolated"""
+        if time is None: time = perf_counter()
+        with self.lock:
+            for name, data in players.items():
+                if name not in self.buffers: self.buffers[name] = SnapshotBuffer(self.size)
+                self.buffers[name].add(time, data)
+
+    def get(self, name, time:float=None):
+        """The player's data to show at time (by default now), or None if there haven't been any snapshots of them"""
+        if time is None: time = perf_counter()
+        with self.lock:
+            if name not in self.buffers: return None
+            return self.buffers[name].sample(time-self.delay, self.maxExtrapolation)
@@ -0,0 +1,43 @@
+"""
+Frame rate limiting which sleeps through most of each frame instead of spinning the CPU the whole time
+"""
+
+import time
+import statistics
+from collections import deque
+
+
+class FramePacer:
+    def __init__(self, fps:int, spinTime:float=0.001, history:int=240):
+        """Limits the frame rate to fps. It sleeps until spinTime seconds before the next frame
+        is due, then busy-waits for the rest, as sleeping isn't accurate enough on its own"""
+        self.frameLength = 1/fps
+        self.spinTime = spinTime
+        self.lastFrame = time.perf_counter()
+        self.frameTimes = deque(maxlen=history) # seconds each of the last few frames took
+
+    def tick(self):
+        """Waits until it is time for the next frame, returning the milliseconds since the last one (like Clock.tick)"""
+        nextFrame = self.lastFrame+self.frameLength
+        remaining = nextFrame-time.perf_counter()
+        if remaining > self.spinTime: time.sleep(remaining-self.spinTime) # let other threads (e.g. the server) have the CPU
+        while time.perf_counter() < nextFrame: pass # spin for the last bit, to be on time
+
+        now = time.perf_counter()
+        frameTime = now-self.lastFrame
+        self.lastFrame = now
+        self.frameTimes.append(frameTime)
+        return frameTime*1000
+
+    def getFps(self):
+        """Average frame rate over the last few frames"""
+        if not self.frameTimes: return 0
+        return len(self.frameTimes)/sum(self.frameTimes)
+
+    def getJitter(self):
+        """Statistics of the last few frame times in milliseconds: the mean, standard
+        deviation, and the furthest any frame was from the target frame length"""
+        if len(self.frameTimes) < 2: return 0, 0, 0
+        frameTimes = [frameTime*1000 for frameTime in self.frameTimes]
+        worst = max(abs(frameTime-self.frameLength*1000) for frameTime in frameTimes)
+        return statistics.fmean(frameTimes), statistics.stdev(frameTimes), worst
@@ -0,0 +1,71 @@
+"""
+Times each part of the game loop, so it can be seen where the time in a frame goes
+"""
+
+import json
+import time
+from collections import deque
+
+
+class FrameProfiler:
+    def __init__(self, history:int=240):
+        """Records how long each section of the last history frames took. Sections are timed like laps
+        of a stopwatch: lap(name) records the time since the previous lap (or the start of the frame) as name"""
+        self.enabled = False
+        self.history = history
+        self.origin = time.perf_counter()
+        self.frames = deque(maxlen=history) # (start, end, [(name, start, duration), ...]) for each frame
+        self.sectionTimes = {}               # name: deque of the total milliseconds spent in that section each frame
+        self.frameStart = None
+        self.lapStart = None
+        self.laps = []
+
+    def newFrame(self):
+        """Finishes recording the previous frame and starts timing a new one"""
+        if not self.enabled: return
+        now = time.perf_counter()
+        if self.frameStart is not None: self.endFrame(self.lapStart)
+        self.frameStart = self.lapStart = now
+        self.laps = []
+
+    def lap(self, name:str):
+        """Records the time since the last lap as having been spent in the section called name"""
+        if not self.enabled or self.lapStart is None: return
+        now = time.perf_counter()
+        self.laps.append((name, self.lapStart, now-self.lapStart))
+        self.lapStart = now
+
+    def endFrame(self, end:float):
+        totals = {}
+        for name, _, duration in self.laps: # a section can happen more than once a frame, e.g. once per tick
+            totals[name] = totals.get(name, 0)+duration*1000
+        for name in totals.keys() | self.sectionTimes.keys():
+            if name not in self.sectionTimes: self.sectionTimes[name] = deque(maxlen=self.history)
+            self.sectionTimes[name].append(totals.get(name, 0))
+        self.frames.append((self.frameStart, end, self.laps))
+
+    def toggle(self):
+        """Turns the profiler on or off, forgetting everything recorded so far"""
+        self.enabled = not self.enabled
+        self.frames.clear()
+        self.sectionTimes.clear()
+        self.frameStart = self.lapStart = None
+
+    def getStats(self):
+        """Gives back (name, mean milliseconds, 99th percentile milliseconds) of each section per frame"""
+        stats = []
+        for name, times in self.sectionTimes.items():
+            ordered = sorted(times)
+            stats.append((name, sum(ordered)/len(ordered), ordered[min(int(len(ordered)*0.99), len(ordered)-1)]))
+        return stats
+
+    def exportTrace(self, path:str="profile.json"):
+        """Writes the recorded frames to a Chrome trace file, which can be opened in chrome://tracing or Perfetto"""
+        events = []
+        for start, end, laps in self.frames:
+            events.append({"name": "frame", "ph": "X", "pid": 0, "tid": 0,
+                           "ts": (start-self.origin)*1e6, "dur": (end-start)*1e6})
+            for name, lapStart, duration in laps:
+                events.append({"name": name, "ph": "X", "pid": 0, "tid": 1,
+                               "ts": (lapStart-self.origin)*1e6, "dur": duration*1e6})
+        with open(path, "w") as file: json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
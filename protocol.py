@@ -0,0 +1,133 @@
+"""
+The binary format the client and server send game data in, instead of str() and eval()
+
+Every message starts with a header of the protocol version, the message type, the number of records
+in it and a sequence number (e.g. the server's state version), followed by that many fixed-size records:
+    player:     name (32 bytes of utf-8, padded with zeros), x, y, barrel angle, barrel power, health
+    projectile: x, y, radius, angle, power, damage
+    inputs:     name, which inputs are held down (a bit each), number of shots fired, for one tick each
+    crater:     x, y, radius
+Several messages can be sent one after another in the same request or response, e.g. for an exchange
+"""
+
+import struct
+
+VERSION = 4
+PLAYERS = 1
+PROJECTILES = 2
+INPUTS = 3
+CRATERS = 4
+
+header = struct.Struct("<BBHI")          # version, message type, number of records, sequence number
+player = struct.Struct("<32siihhh")      # name, x, y, angle, power, health
+projectile = struct.Struct("<iihhhh")    # x, y, radius, angle, power, damage
+inputs = struct.Struct("<32sBB")         # name, held inputs, shots
+crater = struct.Struct("<iih")           # x, y, radius
+recordFormats = {PLAYERS: player, PROJECTILES: projectile, INPUTS: inputs, CRATERS: crater}
+
+
+class ProtocolError(ValueError):
+    """Raised when a message can't be decoded, e.g. it is from a different version of the game"""
+
+
+def encode(messageType:int, recordFormat:struct.Struct, records:list, sequence:int=0):
+    """Packs a list of records (tuples of the record format's fields) into a message"""
+    body = bytearray(header.pack(VERSION, messageType, len(records), sequence))
+    for record in records: body += recordFormat.pack(*record)
+    return bytes(body)
+
+
+def decode(messageType:int, recordFormat:struct.Struct, body:bytes):
+    """Unpacks a message into its sequence number and list of records, checking it is the right version and type"""
+    if len(body) < header.size: raise ProtocolError("message is too short")
+    version, bodyType, count, sequence = header.unpack_from(body)
+    if version != VERSION: raise ProtocolError(f"message is version {version}, expected version {VERSION}")
+    if bodyType != messageType: raise ProtocolError(f"message is type {bodyType}, expected type {messageType}")
+    if len(body) != header.size+count*recordFormat.size: raise ProtocolError("message is the wrong length")
+    return sequence, list(recordFormat.iter_unpack(memoryview(body)[header.size:]))
+
+
+def split(body:bytes):
+    """Splits several messages sent one after another into a list of the separate messages"""
+    messages = []
+    offset = 0
+    while offset < len(body):
+        if len(body)-offset < header.size: raise ProtocolError("message is too short")
+        _, messageType, count, _ = header.unpack_from(body, offset)
+        if messageType not in recordFormats: raise ProtocolError(f"unknown message type {messageType}")
+        end = offset+header.size+count*recordFormats[messageType].size
+        messages.append(body[offset:end]) # a message cut short is caught when it is decoded
+        offset = end
+    return messages
+
+
+def encodePlayers(players:dict, version:int=0):
+    """Packs a dictionary of {name: (x, y, angle, power, health)} and the state version it is from into a message"""
+    return encode(PLAYERS, player, [(name.encode("utf-8")[:32], *data) for name, data in players.items()], version)
+
+
+def decodePlayers(body:bytes):
+    """Unpacks a message of players into its state version and a dictionary of {name: (x, y, angle, power, health)}"""
+    version, records = decode(PLAYERS, player, body)
+    return version, {name.rstrip(b"\0").decode("utf-8", "replace"): tuple(data) for name, *data in records}
+
+
+def encodeProjectiles(projectiles:list, sequence:int=0):
+    """Packs a list of (x, y, radius, angle, power, damage) projectiles into a message"""
+    return encode(PROJECTILES, projectile, projectiles, sequence)
+
+
+def decodeProjectiles(body:bytes):
+    """Unpacks a message of projectiles into its sequence number and a list of (x, y, radius, angle, power, damage)"""
+    return decode(PROJECTILES, projectile, body)
+
+
+def encodeInputs(name:str, ticks:list, sequence:int=0):
+    """Packs a player's (held inputs, shots) for each of a run of ticks into a message, whose sequence number is the
+    first tick's. With no ticks it is just a sequence number, e.g. the last tick the server has used"""
+    return encode(INPUTS, inputs, [(name.encode("utf-8")[:32], *data) for data in ticks], sequence)
+
+
+def decodeInputs(body:bytes):
+    """Unpacks a message of inputs into its sequence number, the player's name ("" if there are no ticks)
+    and a list of (held inputs, shots)"""
+    sequence, records = decode(INPUTS, inputs, body)
+    names = {name for name, _, _ in records}
+    if len(names) > 1: raise ProtocolError("a message of inputs should be from one player")
+    name = names.pop().rstrip(b"\0").decode("utf-8", "replace") if names else ""
+    return sequence, name, [(held, shots) for _, held, shots in records]
+
+
+def encodeCraters(craters:list, sequence:int=0):
+    """Packs a list of (x, y, radius) craters into a message"""
+    return encode(CRATERS, crater, craters, sequence)
+
+
+def decodeCraters(body:bytes):
+    """Unpacks a message of craters into its sequence number and a list of (x, y, radius)"""
+    return decode(CRATERS, crater, body)
+
+
+decoders = {PLAYERS: decodePlayers, PROJECTILES: decodeProjectiles, INPUTS: decodeInputs, CRATERS: decodeCraters}
+
+
+def encodeExchange(*messages:bytes):
+    """Joins several messages into one body"""
+    return b"".join(messages)
+
+
+def decodeMessages(body:bytes):
+    """Unpacks a body of several messages into a dictionary of {message type: (sequence number, records)}"""
+    messages = {}
+    for message in split(body):
+        messageType = header.unpack_from(message)[1]
+        messages[messageType] = decoders[messageType](message)
+    return messages
+
+
+def decodeExchange(body:bytes, *messageTypes:int):
+    """Unpacks a body of several messages, giving back the (sequence number, records) of each of messageTypes in order"""
+    messages = decodeMessages(body)
+    for messageType in messageTypes:
+        if messageType not in messages: raise ProtocolError(f"the exchange is missing a message of type {messageType}")
+    return [messages[messageType] for messageType in messageTypes]
@@ -0,0 +1,58 @@
+"""
+Sends data to the server from a background thread, so the game loop never waits on the network
+"""
+
+import struct
+import threading
+from collections import deque
+from http.client import HTTPException
+from time import perf_counter
+
+
+class Sender:
+    def __init__(self, send, rate:float=20, maxEvents:int=None, maxQueued:int=None):
+        """Calls send(events) rate times a second in a background thread, where events is a list of everything
+        queued by queue since the last send, at most maxEvents at a time. It is still called when nothing has been
+        queued, so replies keep coming. If more than maxQueued events build up, e.g. while the server can't be
+        reached, the oldest are dropped, so the backlog can always be caught up on"""
+        self.send = send
+        self.interval = 1/rate
+        self.maxEvents = maxEvents
+        self.maxQueued = maxQueued
+        self.events = deque()
+        self.failures = 0 # number of sends that failed because of the network
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def queue(self, event):
+        """Adds an event to be sent, which is only dropped if too many build up"""
+        self.events.append(event)
+        self.trim()
+
+    def trim(self):
+        """Drops the oldest events until there are at most maxQueued"""
+        if self.maxQueued is None: return
+        while len(self.events) > self.maxQueued: self.events.popleft()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self, timeout:float=2):
+        """Stops sending, waiting up to timeout seconds for the send in progress (if any) to finish"""
+        self.stopped.set()
+        if self.thread.is_alive(): self.thread.join(timeout)
+
+    def run(self):
+        nextSend = perf_counter()
+        while not self.stopped.is_set():
+            events = [] # taken off the queue one by one, as the game loop may be adding more at the same time
+            while self.events and (self.maxEvents is None or len(events) < self.maxEvents): events.append(self.events.popleft())
+            try: self.send(events)
+            except (OSError, HTTPException, ValueError, struct.error): # the network or server had a problem, try again next time
+                self.failures += 1
+                self.events.extendleft(reversed(events))
+                self.trim()
+
+            # wait until the next send is due, or skip ahead if this one took too long
+            nextSend = max(nextSend+self.interval, perf_counter())
+            self.stopped.wait(nextSend-perf_counter())
@@ -1,11 +1,19 @@
 import wsgiserver
+import protocol
+from asyncserver import AsyncServer
+from profiler import FrameProfiler
 
 import threading
-from time import sleep
+import traceback
+from time import sleep, perf_counter
+from collections import deque
+from urllib.parse import parse_qs
 
 
 class Server:
-    def __init__(self, port:int=8000):
+    def __init__(self, port:int=8000, backend:str="asyncio"):
+        """The backend is either "asyncio", which handles every connection on one thread, or "wsgi", the
+        original thread-per-connection WSGIServer, which can only handle 10 connections at once"""
         self.sep = "/"
         self.paths = wsgiserver.WSGIPathInfoDispatcher({
             "/": self._main,
@@ -14,27 +22,45 @@ class Server:
             "/addPlayer": self._addPlayer,
             "/addProjectile": self._addProjectile,
             "/getProjectileData": self._getProjectileData,
+            "/exchange": self._exchange,
         })
-        self.server = wsgiserver.WSGIServer(self.paths, port=port)
+        if backend == "asyncio": self.server = AsyncServer(self.paths, port=port)
+        elif backend == "wsgi": self.server = wsgiserver.WSGIServer(self.paths, port=port)
+        else: raise ValueError(f"unknown server backend {backend}")
         self.players = {}
-        self.projectiles = []
+        self.projectiles = []        # (owner, data) of every projectile not yet seen by all the clients
+        self.projectileSequence = 0  # sequence number of the newest projectile, the first being 1
+        self.projectileCursors = {}  # name: (sequence number of the last projectile the client has seen, when it said so)
+        self.cursorTimeout = 10      # seconds after which a client that has stopped polling is assumed to have left
+        self.version = 0         # goes up by one every time a player changes
+        self.playerVersions = {} # name: the state version the player last changed in
+        self.lock = threading.RLock() # requests are handled by several threads at once
+
+        # only used when the server is authoritative, i.e. it runs the game and the clients just send their inputs
+        self.ground = None
+        self.tanks = {}          # name: the server's tank for each player
+        self.inputs = {}         # name: queue of (sequence number, inputs held down, shots) for each tick not yet used
+        self.inputSequences = {} # name: sequence number of the last tick's inputs received from each player
+        self.acknowledged = {}   # name: sequence number of the last tick's inputs used, which the players are up to date with
+        self.maxInputQueue = 8   # if more ticks of a player's inputs than this are waiting, more than one is used a tick
+        self.simulationLock = threading.Lock() # held while the game is being changed, so it can be drawn safely
+        self.simulationStopped = threading.Event()
+        self.lastTick = 0 # when the last tick finished, so the host knows how far it is through the next one
+        self.profiler = FrameProfiler()
 
         printThread = threading.Thread(target=self.printDict, daemon=True)
         # printThread.start()
 
         # players dictionary format:
         # self.players = {
-        #              "name": {
-        #                       0: xcoord,
-        #                       1: ycoord,
-        #                       2: barrel angle,
-        #                       3: barrel power,
-        #                       4: health,
-        #                       }
+        #              "name": (xcoord, ycoord, barrel angle, barrel power, health)
         #            }
 
         # projectiles list format:
-        # self.projectiles = [(xcoord, ycoord, radius, angle, power)]
+        # self.projectiles = [("owner", (xcoord, ycoord, radius, angle, power, damage))]
+        # both are sent to and from clients packed by protocol.py. clients only get sent the players that
+        # have changed since the last state version they saw, and the projectiles fired by someone else
+        # since the last one they saw. projectiles every client has seen are then forgotten
 
     def start(self):
         """Starts the server"""
@@ -44,25 +70,168 @@ class Server:
         """Stops the server"""
         self.server.stop()
 
-    def addPlayer(self, name, data):
-        """Adds a player to the server (host only)"""
-        self.players[name] = {index:item for index, item in enumerate(data)}
+    def updatePlayers(self, players:dict):
+        """Stores new player data, giving each player that has actually changed a new state version"""
+        with self.lock:
+            for name, data in players.items():
+                data = tuple(data)
+                if self.players.get(name) == data: continue
+                self.version += 1
+                self.players[name] = data
+                self.playerVersions[name] = self.version
+
+    def addPlayer(self, name, data, enemy:bool=True):
+        """Adds a player to the server (host only). If the server is authoritative, this makes their tank,
+        which is given back. enemy is which image the tank has, for when the host draws the server's tanks"""
+        if self.ground is not None and name not in self.tanks:
+            import game # imported here, as game imports this module
+            with self.simulationLock: self.tanks[name] = game.Tank(*data, enemy=enemy, name=name)
+        if name in self.tanks: data = self.tanks[name].getData() # the tank fills in anything data left out
+        self.updatePlayers({name: data})
+        return self.tanks.get(name)
     
     def sendPlayerData(self, name, data):
         """Sends data to the server (host only)"""
-        self.players[name] = {index:item for index, item in enumerate(data)}
+        self.updatePlayers({name: data})
     
-    def getPlayerData(self):
-        """Receives data from the server (host only)"""
-        return self.players
+    def getPlayerData(self, since:int=0):
+        """Receives the current state version and the players that have changed since the version since (host only)"""
+        with self.lock:
+            if since > self.version: since = 0 # it must have seen a different server, so it needs everything
+            return self.version, {name: self.players[name] for name, version in self.playerVersions.items() if version > since}
+
+    def addProjectiles(self, owner:str, projectiles:list):
+        """Adds projectiles fired by the player called owner to the end of the log"""
+        with self.lock:
+            for data in projectiles: self.projectiles.append((owner, tuple(data)))
+            self.projectileSequence += len(projectiles)
+            self.compactProjectiles() # otherwise the log would grow forever while no clients are polling
 
-    def addProjectile(self, data):
+    def addProjectile(self, owner, data):
         """Adds a projectile to the server (host only)"""
-        self.projectiles.append(list(data))
+        self.addProjectiles(owner, [data])
     
-    def getProjectileData(self):
-        """Receives data from the server (host only)"""
-        return self.projectiles
+    def getProjectileData(self, after:int=0, name:str=""):
+        """Receives the newest projectile's sequence number and every projectile after the sequence number after
+        that wasn't fired by name. This also tells the server name has seen every projectile up to after.
+        A player the server hasn't heard from before only gets the projectiles fired from now on (host only)"""
+        with self.lock:
+            if after > self.projectileSequence: after = 0 # it must have seen a different server
+            if after == 0 and name and name not in self.projectileCursors: after = self.projectileSequence # it has just joined
+            if name: self.projectileCursors[name] = (after, perf_counter())
+            self.compactProjectiles()
+            first = self.projectileSequence-len(self.projectiles)+1 # sequence number of the oldest one still kept
+            newProjectiles = self.projectiles[max(after-first+1, 0):]
+            return self.projectileSequence, [data for owner, data in newProjectiles if owner != name]
+
+    def compactProjectiles(self):
+        """Forgets the projectiles that every client still polling has seen, or all of them if none are polling"""
+        now = perf_counter()
+        cursors = [cursor for cursor, seen in self.projectileCursors.values() if now-seen < self.cursorTimeout]
+        if not cursors: cursors = [self.projectileSequence]
+        first = self.projectileSequence-len(self.projectiles)+1
+        del self.projectiles[:max(min(cursors)-first+1, 0)]
+
+    def exchange(self, name, data, projectiles, since:int=0, after:int=0):
+        """Stores a player's data and the projectiles they have fired, and receives the players changed since the
+        state version since and the projectiles after the sequence number after, all at once (host only)"""
+        self.updatePlayers({name: data})
+        if projectiles: self.addProjectiles(name, projectiles)
+        return (*self.getPlayerData(since), *self.getProjectileData(after, name))
+
+    def startSimulation(self, ground):
+        """Makes the server authoritative: it runs the game on the ground in a background thread, moving each
+        player's tank by the inputs they send, and sends back where everything is. The game's tanks,
+        projectiles and explosions are the ones in the game module, so the host can draw them directly"""
+        self.ground = ground
+        self.simulationStopped.clear()
+        self.simulation = threading.Thread(target=self.simulate, daemon=True)
+        self.simulation.start()
+
+    def stopSimulation(self):
+        """Stops the game, waiting for the tick in progress to finish"""
+        self.simulationStopped.set()
+        self.simulation.join()
+
+    def simulate(self):
+        """Runs the game at the tick rate until the simulation is stopped"""
+        import game
+        nextTick = perf_counter()
+        while not self.simulationStopped.is_set():
+            self.profiler.newFrame()
+            try: self.simulateTick()
+            except Exception: traceback.print_exc() # one bad tick shouldn't stop the game for everyone
+
+            # wait for the next tick, catching up on ticks missed by running late (but not too many)
+            nextTick = max(nextTick+game.tickLength/1000, perf_counter()-game.maxFrameTime/1000)
+            self.simulationStopped.wait(max(nextTick-perf_counter(), 0))
+
+    def simulateTick(self):
+        """Moves the server's game on by one tick, then publishes where every player is"""
+        import game # imported here, as game imports this module
+        acknowledged = {}
+        with self.simulationLock: # also stops players being added to self.tanks part way through
+            # each tick of inputs is used exactly once, so a client can replay the ones it has sent since
+            # to predict where its tank is. nothing is done for a player if none of their inputs have arrived
+            for name, tank in self.tanks.items():
+                for sequence, held, shots in self.takeInputs(name):
+                    acknowledged[name] = sequence
+                    if not tank.isAlive(): continue
+                    game.applyInputs(tank, game.unpackInputs(held), self.ground)
+                    for shot in range(shots): self.addProjectiles("", [tank.shoot().getData()]) # sent to everyone
+            self.profiler.lap("input")
+            game.simulateTick(self.ground, self.profiler)
+            players = {name: tank.getData() for name, tank in self.tanks.items()}
+            self.lastTick = perf_counter()
+        with self.lock: # so the players are never sent with the inputs of a different tick
+            self.acknowledged.update(acknowledged)
+            self.updatePlayers(players)
+        self.profiler.lap("publish")
+
+    def sendInputs(self, name, ticks:list, sequence:int=None):
+        """Queues a player's (inputs held down, shots) for each of their next ticks, the first of which is numbered
+        sequence (by default the one after the last received). Ticks already received are ignored (host only)"""
+        with self.lock:
+            received = self.inputSequences.get(name, 0)
+            if sequence is None: sequence = received+1
+            queue = self.inputs.setdefault(name, deque())
+            for number, (held, shots) in enumerate(ticks, sequence):
+                if number > received: queue.append((number, held, shots))
+            self.inputSequences[name] = max(received, sequence+len(ticks)-1)
+
+    def takeInputs(self, name):
+        """Takes the (sequence number, inputs held down, shots) of a player's ticks to use this tick. This is usually
+        one, or none if they haven't arrived yet, but more if too many have built up, to catch up"""
+        with self.lock:
+            queue = self.inputs.get(name)
+            if not queue: return []
+            return [queue.popleft() for tick in range(max(len(queue)-self.maxInputQueue, 1))]
+
+    def getCraters(self, after:int=0):
+        """Receives the number of craters made and every crater after the first after (host only). These
+        are never forgotten, as every one is needed to make the ground the same on another computer"""
+        craters = self.ground.craters[:] if self.ground is not None else []
+        if after > len(craters): after = 0
+        return len(craters), craters[after:]
+
+    def exchangeInputs(self, name, ticks, sequence:int, since:int=0, after:int=0, craterCursor:int=0):
+        """Queues a player's inputs for a run of ticks, and receives the players changed since the state version since,
+        the projectiles after the sequence number after, the craters after craterCursor and the sequence number
+        of the player's last tick of inputs used, which the players are up to date with, all at once (host only)"""
+        self.sendInputs(name, ticks, sequence)
+        with self.lock:
+            players = self.getPlayerData(since)
+            acknowledged = self.acknowledged.get(name, 0)
+        return (*players, *self.getProjectileData(after, name), *self.getCraters(craterCursor), acknowledged)
+
+    def readQuery(self, environ):
+        """Reads the parameters in a request's URL, e.g. {"since": "3"} from /getPlayerData?since=3"""
+        return {key: values[0] for key, values in parse_qs(environ.get("QUERY_STRING", "")).items()}
+
+    def readBody(self, environ):
+        """Reads the content sent with a request"""
+        length = environ.get("CONTENT_LENGTH")
+        return environ["wsgi.input"].read(int(length)) if length else b""
 
     def _main(self, environ, start_response):
         """Main page, appears as a gateway error to prevent external manipulation"""
@@ -71,45 +240,72 @@ class Server:
     
     def _sendPlayerData(self, environ, start_response):
         """Server is RECEIVING external data"""
-        data = environ["PATH_INFO"][1:].split("/")
-        if data: self.players[data[0]] = {index:int(item) if item.isnumeric() else item for index, item in enumerate(data[1:])}
+        try: self.updatePlayers(protocol.decodePlayers(self.readBody(environ))[1])
+        except protocol.ProtocolError: pass # ignore anything that isn't from this version of the game
         start_response("503", [('Content-type','text/plain')])
         yield b""
 
     def _getPlayerData(self, environ, start_response):
-        """Server is SENDING data externally"""
-        start_response("503", [("Content-type", "text/plain")])
-        body = bytes(str(self.players), "utf-8")
-        yield body
+        """Server is SENDING data externally, only the players that have changed since the version the client
+        last saw (the since parameter). Nothing is sent back if none have (like HTTP's 304 Not Modified)"""
+        since = self.readQuery(environ).get("since", "0")
+        version, players = self.getPlayerData(int(since) if since.isdigit() else 0)
+        start_response("503", [("Content-type", "application/octet-stream")])
+        yield protocol.encodePlayers(players, version) if players else b""
     
     def _addPlayer(self, environ, start_response):
         """Adds a player to the server"""
-        data = environ["PATH_INFO"][1:].split("/")
-        if data: self.players[data[0]] = {index:int(item) if item.isnumeric() else item for index, item in enumerate(data[1:])}
+        try: 
+            for name, data in protocol.decodePlayers(self.readBody(environ))[1].items(): self.addPlayer(name, data)
+        except protocol.ProtocolError: pass
         start_response("503", [('Content-type','text/plain')])
         yield b""
     
     def _addProjectile(self, environ, start_response):
-        """Adds a projectile to the server"""
-        data = environ["PATH_INFO"][1:].split("/")
-        if data: self.projectiles.append([int(item) if item.isnumeric() else item for item in data])
+        """Adds a projectile to the server, fired by the player in the name parameter"""
+        try: self.addProjectiles(self.readQuery(environ).get("name", ""), protocol.decodeProjectiles(self.readBody(environ))[1])
+        except protocol.ProtocolError: pass
         start_response("503", [('Content-type','text/plain')])
         yield b""
     
     def _getProjectileData(self, environ, start_response):
-        """Gets the projectile data from the server"""
-        start_response("503", [("Content-type", "text/plain")])
-        body = bytes(str(self.projectiles), "utf-8")
+        """Gets the projectiles after the sequence number in the after parameter, that weren't fired
+        by the player in the name parameter. Nothing is sent back if there are none newer"""
+        query = self.readQuery(environ)
+        after = query.get("after", "0")
+        after = int(after) if after.isdigit() else 0
+        sequence, projectiles = self.getProjectileData(after, query.get("name", ""))
+        start_response("503", [("Content-type", "application/octet-stream")])
+        yield protocol.encodeProjectiles(projectiles, sequence) if sequence != after else b""
+    
+    def _exchange(self, environ, start_response):
+        """Receives a client's player and new projectiles, or its inputs if the server is authoritative, and sends
+        back everything that has changed since it last asked. The sequence numbers sent say what it has already seen"""
+        try:
+            messages = protocol.decodeMessages(self.readBody(environ))
+            since, players = messages.get(protocol.PLAYERS, (0, {}))
+            after, projectiles = messages.get(protocol.PROJECTILES, (0, []))
+            if protocol.INPUTS in messages:
+                sequence, name, ticks = messages[protocol.INPUTS]
+                if not name: raise protocol.ProtocolError("the inputs need at least one tick, to say whose they are")
+                craterCursor = messages.get(protocol.CRATERS, (0, []))[0]
+                version, players, sequence, projectiles, craterCount, craters, acknowledged = self.exchangeInputs(
+                    name, ticks, sequence, since, after, craterCursor)
+                body = protocol.encodeExchange(protocol.encodePlayers(players, version), protocol.encodeProjectiles(projectiles, sequence),
+                    protocol.encodeCraters(craters, craterCount), protocol.encodeInputs(name, [], acknowledged))
+            else:
+                (name, data), = players.items()
+                version, players, sequence, projectiles = self.exchange(name, data, projectiles, since, after)
+                body = protocol.encodeExchange(protocol.encodePlayers(players, version), protocol.encodeProjectiles(projectiles, sequence))
+        except ValueError: body = b"" # including protocol.ProtocolError
+        start_response("503", [("Content-type", "application/octet-stream")])
         yield body
     
     def printDict(self):
         while True:
             print("{")
             for index in self.players:
-                print(f"\t{index}: {'{'}")
-                for item in self.players[index]:
-                    print(f"\t\t{item}: {self.players[index][item]}")
-                print("\t}")
+                print(f"\t{index}: {self.players[index]}")
             print("}")
             print(self.projectiles)
             sleep(1)
\ No newline at end of file